@@ -7,6 +7,10 @@ source venv/bin/activate
 pip install -r requirements.txt
 python3 manage.py collectstatic --noinput
 python3 manage.py migrate --noinput
+python3 manage.py createcachetable
+python3 manage.py refresh_order_candidates
+python3 manage.py make_thumbnails
+python3 manage.py publish_catalog
 npm ci --dev
 ./node_modules/.bin/parcel build bundles-src/index.js --dist-dir bundles --public-url="./"
 systemctl restart burger-server
@@ -1,23 +1,216 @@
-from urllib.error import HTTPError
+import csv
+import hashlib
+import json
+import random
+import threading
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
 
-def fetch_coordinates(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    try:
-        response = requests.get(base_url, params={
+from location.address import normalize_address
+
+
+class GeocoderError(Exception):
+    pass
+
+
+class GeocoderUnavailable(GeocoderError):
+    pass
+
+
+class CircuitBreaker:
+    """Перестаёт пропускать запросы после серии неудач подряд.
+
+    После `failure_threshold` ошибок подряд цепь размыкается на
+    `reset_timeout` секунд: все вызовы сразу получают отказ. Затем
+    пропускается один пробный запрос — при успехе цепь замыкается,
+    при ошибке снова размыкается.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_in_progress:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Общий для всех потоков ограничитель частоты запросов."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        time.sleep(max(0, slot - now))
+
+
+class YandexGeocoder:
+    BASE_URL = 'https://geocode-maps.yandex.ru/1.x'
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, apikey, base_url=BASE_URL, connect_timeout=3.05,
+                 read_timeout=5, max_retries=2, backoff=0.5, pool_size=10,
+                 breaker=None, rate_limiter=None):
+        self.apikey = apikey
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings.GEOCODER_API_KEY,
+            connect_timeout=settings.GEOCODER_CONNECT_TIMEOUT,
+            read_timeout=settings.GEOCODER_READ_TIMEOUT,
+            max_retries=settings.GEOCODER_MAX_RETRIES,
+        )
+
+    def fetch_coordinates(self, address):
+        """Возвращает (долгота, широта) или (None, None), если адрес не найден.
+
+        Сетевые ошибки и ответы 429/5xx повторяются с backoff, после
+        исчерпания попыток бросается GeocoderUnavailable.
+        """
+        response = self._request(address)
+        try:
+            found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+            if not found_places:
+                return None, None
+            most_relevant = found_places[0]
+            lon, lat = map(float, most_relevant['GeoObject']['Point']['pos'].split(" "))
+        except (ValueError, KeyError, IndexError, TypeError) as error:
+            raise GeocoderError(f'Неожиданный ответ геокодера: {error!r}') from error
+        return lon, lat
+
+    def _request(self, address):
+        params = {
             "geocode": address,
-            "apikey": apikey,
+            "apikey": self.apikey,
             "format": "json",
-        })
-        response.raise_for_status()
-    except HTTPError:
-        return None, None
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-
-    if not found_places:
-        return None, None
-
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return lon, lat
+        }
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise GeocoderUnavailable('Геокодер недоступен, запрос не выполнялся')
+            if self.rate_limiter:
+                self.rate_limiter.wait()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except requests.RequestException as error:
+                self.breaker.record_failure()
+                last_error = error
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.breaker.record_success()
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError as error:
+                        raise GeocoderError(str(error)) from error
+                    return response
+                self.breaker.record_failure()
+                last_error = requests.HTTPError(f'{response.status_code} от геокодера', response=response)
+            if attempt < self.max_retries:
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        raise GeocoderUnavailable(str(last_error)) from last_error
+
+
+class OfflineGeocoder:
+    """Геокодер без сети для нагрузочных тестов и CI.
+
+    Координаты берутся из фикстуры (CSV с колонками address, longitude,
+    latitude или JSON вида {"адрес": [долгота, широта]}); адрес с пустыми
+    координатами в фикстуре считается ненайденным. Остальные адреса
+    детерминированно раскладываются по хэшу внутри bbox. Каждый запрос
+    ждёт `latency` секунд, имитируя настоящий геокодер.
+    """
+    MOSCOW_BBOX = (37.35, 55.57, 37.85, 55.92)
+
+    def __init__(self, fixture_path=None, bbox=MOSCOW_BBOX, latency=0, rate_limiter=None):
+        self.bbox = bbox
+        self.latency = latency
+        self.rate_limiter = rate_limiter
+        self.places = self.load_fixture(fixture_path) if fixture_path else {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            fixture_path=settings.GEOCODER_FIXTURE,
+            latency=settings.GEOCODER_LATENCY,
+        )
+
+    @staticmethod
+    def load_fixture(fixture_path):
+        with open(fixture_path, encoding='utf-8') as fixture:
+            if fixture_path.endswith('.json'):
+                rows = [
+                    (address, *(coordinates or (None, None)))
+                    for address, coordinates in json.load(fixture).items()
+                ]
+            else:
+                rows = [
+                    (row['address'], row['longitude'], row['latitude'])
+                    for row in csv.DictReader(fixture)
+                ]
+        places = {}
+        for address, lon, lat in rows:
+            if lon in (None, '') or lat in (None, ''):
+                places[normalize_address(address)] = (None, None)
+            else:
+                places[normalize_address(address)] = (float(lon), float(lat))
+        return places
+
+    def fetch_coordinates(self, address):
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        if self.latency:
+            time.sleep(self.latency)
+        normalized_address = normalize_address(address)
+        if normalized_address in self.places:
+            return self.places[normalized_address]
+        digest = hashlib.sha256(normalized_address.encode()).digest()
+        lon_share = int.from_bytes(digest[:8], 'big') / 2 ** 64
+        lat_share = int.from_bytes(digest[8:16], 'big') / 2 ** 64
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        return (
+            min_lon + (max_lon - min_lon) * lon_share,
+            min_lat + (max_lat - min_lat) * lat_share,
+        )
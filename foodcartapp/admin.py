@@ -1,5 +1,6 @@
+from django import forms
 from django.conf import settings
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 from django.templatetags.static import static
@@ -12,8 +13,11 @@ from .models import Restaurant
 from .models import RestaurantMenuItem
 from .models import Order
 from .models import OrderElement
-from location.models import Location
-from fetch_coordinates import fetch_coordinates
+from .candidates import refresh_candidates
+from .thumbnails import make_thumbnails
+from location.models import Location, GeocodeJob
+from fetch_coordinates import GeocoderError
+from location.geocoder import get_geocoder
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -37,11 +41,17 @@ class RestaurantAdmin(admin.ModelAdmin):
         'name',
         'address',
         'contact_phone',
+        'capacity',
     ]
     inlines = [
         RestaurantMenuItemInline
     ]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.address and 'address' in form.changed_data:
+            GeocodeJob.objects.enqueue(obj.address)
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = [
@@ -98,17 +108,41 @@ class ProductAdmin(admin.ModelAdmin):
             )
         }
 
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            obj.has_thumbnails = False
+        super().save_model(request, obj, form, change)
+        if obj.image and not obj.has_thumbnails:
+            try:
+                make_thumbnails(obj.image.name)
+            except OSError as error:
+                self.message_user(request, f'Не удалось уменьшить картинку: {error}', level=messages.WARNING)
+                return
+            obj.has_thumbnails = True
+            obj.save(update_fields=['has_thumbnails'])
+
     def get_image_preview(self, obj):
         if not obj.image:
             return 'выберите картинку'
-        return format_html('<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url)
+        thumbnails = obj.thumbnail_urls()['card']
+        return format_html(
+            '<picture><source srcset="{webp}" type="image/webp"><img src="{jpeg}" style="max-height: 200px;"/></picture>',
+            webp=thumbnails['webp'],
+            jpeg=thumbnails['jpeg'],
+        )
     get_image_preview.short_description = 'превью'
 
     def get_image_list_preview(self, obj):
         if not obj.image or not obj.id:
             return 'нет картинки'
         edit_url = reverse('admin:foodcartapp_product_change', args=(obj.id,))
-        return format_html('<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/></a>', edit_url=edit_url, src=obj.image.url)
+        thumbnails = obj.thumbnail_urls()['list']
+        return format_html(
+            '<a href="{edit_url}"><picture><source srcset="{webp}" type="image/webp"><img src="{jpeg}" style="max-height: 50px;"/></picture></a>',
+            edit_url=edit_url,
+            webp=thumbnails['webp'],
+            jpeg=thumbnails['jpeg'],
+        )
     get_image_list_preview.short_description = 'превью'
 
 
@@ -116,8 +150,35 @@ class ProductAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     pass
 
+class OrderAdminForm(forms.ModelForm):
+    loaded_version = forms.IntegerField(
+        widget=forms.HiddenInput,
+        required=False,
+    )
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['loaded_version'].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        loaded_version = cleaned_data.get('loaded_version')
+        if (
+            self.instance.pk
+            and loaded_version is not None
+            and Order.objects.filter(pk=self.instance.pk).exclude(version=loaded_version).exists()
+        ):
+            raise forms.ValidationError('Заказ изменили, пока вы его редактировали. Обновите страницу.')
+        return cleaned_data
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    form = OrderAdminForm
     search_fields = [
         'firstname',
         'lastname',
@@ -127,6 +188,14 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [
         OrderElementInline
     ]
+    readonly_fields = [
+        'total_price',
+    ]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_total_price()
+        refresh_candidates(Order.objects.filter(pk=form.instance.pk))
 
     def response_post_save_change(self, request, obj):
         res = super().response_post_save_change(request, obj)
@@ -142,11 +211,33 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
     def response_add(self, request, obj, post_url_continue=None):
-        obj.longitude, obj.latitude = fetch_coordinates(settings.GEOCODER_API_KEY, obj.address)
-        obj.save()
+        self.refresh_coordinates(request, obj)
         return super().response_add(request, obj, post_url_continue)
 
     def response_change(self, request, obj):
-        obj.longitude, obj.latitude = fetch_coordinates(settings.GEOCODER_API_KEY, obj.address)
-        obj.save()
+        self.refresh_coordinates(request, obj)
         return super().response_change(request, obj)
+
+    def refresh_coordinates(self, request, obj):
+        try:
+            obj.longitude, obj.latitude = get_geocoder().fetch_coordinates(obj.address)
+        except GeocoderError as error:
+            self.message_user(request, f'Не удалось определить координаты: {error}', messages.ERROR)
+            return
+        obj.save()
+
+
+@admin.register(GeocodeJob)
+class GeocodeJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'address',
+        'status',
+        'attempts',
+        'run_after',
+    ]
+    list_filter = [
+        'status',
+    ]
+    search_fields = [
+        'address',
+    ]
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from location.cache import location_cache
+
+from .capabilities import MenuCapabilities
+from .models import Order, OrderCandidate, OrderElement
+from .restaurant_index import get_restaurant_index
+
+
+def build_candidates(orders):
+    """Рестораны, способные приготовить каждый заказ, ближайшие первыми.
+
+    Рестораны без координат, а также все рестораны для заказа без
+    координат попадают в конец списка без расстояния.
+    """
+    order_products = {order.id: set() for order in orders}
+    order_elements = (
+        OrderElement.objects
+        .filter(order__in=list(order_products))
+        .values_list('order_id', 'product_id')
+    )
+    for order_id, product_id in order_elements:
+        order_products[order_id].add(product_id)
+    product_ids = set().union(*order_products.values())
+    capable_restaurant_ids = MenuCapabilities.load(product_ids).match(order_products)
+    coordinates = location_cache.get_many({order.address for order in orders})
+    restaurant_index = get_restaurant_index()
+
+    candidates = []
+    for order in orders:
+        capable_ids = set(capable_restaurant_ids[order.id])
+        location = coordinates.get(order.address)
+        ranked = []
+        if location and location.longitude is not None:
+            ranked = restaurant_index.nearest(
+                (location.longitude, location.latitude),
+                limit=settings.RESTAURANTS_SEARCH_LIMIT,
+                radius_km=settings.RESTAURANTS_SEARCH_RADIUS_KM,
+                predicate=capable_ids.__contains__,
+                exact_top_n=settings.DISTANCE_EXACT_TOP_N,
+            )
+        ranked += [
+            (restaurant_id, None)
+            for restaurant_id in sorted(capable_ids)
+            if not location or location.longitude is None or restaurant_id not in restaurant_index.points
+        ]
+        candidates += [
+            OrderCandidate(
+                order=order,
+                restaurant_id=restaurant_id,
+                distance_km=distance_km,
+                rank=rank,
+            )
+            for rank, (restaurant_id, distance_km) in enumerate(ranked, start=1)
+        ]
+    return candidates
+
+
+def refresh_candidates(orders, chunk_size=500):
+    """Пересчитывает кандидатов для необработанных заказов из queryset."""
+    orders = list(orders.filter(status=Order.UNHANDLED).only('id', 'address'))
+    for start in range(0, len(orders), chunk_size):
+        chunk = orders[start:start + chunk_size]
+        with transaction.atomic():
+            OrderCandidate.objects.filter(order__in=chunk).delete()
+            OrderCandidate.objects.bulk_create(build_candidates(chunk))
+            Order.objects.filter(pk__in=[order.pk for order in chunk]).update(updated_at=timezone.now())
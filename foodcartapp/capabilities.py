@@ -0,0 +1,51 @@
+import numpy as np
+
+from .models import RestaurantMenuItem
+
+
+class MenuCapabilities:
+    """Какие рестораны могут приготовить заказ целиком.
+
+    Меню хранится булевой матрицей рестораны × продукты, где учитываются
+    только пункты меню в продаже. Подбор ресторанов для пачки заказов
+    сводится к одному матричному умножению: для каждой пары заказ–ресторан
+    считается число продуктов заказа, которых нет в меню ресторана.
+    """
+
+    def __init__(self, menu_items):
+        menu_items = list(menu_items)
+        self.restaurant_ids = sorted({restaurant_id for restaurant_id, _ in menu_items})
+        self.product_ids = sorted({product_id for _, product_id in menu_items})
+        self.product_index = {product_id: index for index, product_id in enumerate(self.product_ids)}
+        restaurant_index = {restaurant_id: index for index, restaurant_id in enumerate(self.restaurant_ids)}
+        self.matrix = np.zeros((len(self.restaurant_ids), len(self.product_ids)), dtype=bool)
+        for restaurant_id, product_id in menu_items:
+            self.matrix[restaurant_index[restaurant_id], self.product_index[product_id]] = True
+
+    @classmethod
+    def load(cls, product_ids):
+        """Загружает меню только по продуктам `product_ids` — остальные столбцы матрицы заказам не нужны."""
+        return cls(
+            RestaurantMenuItem.objects
+            .filter(availability=True, product_id__in=product_ids)
+            .values_list('restaurant_id', 'product_id')
+        )
+
+    def match(self, orders_products):
+        """Принимает {id заказа: id продуктов}, возвращает {id заказа: [id ресторанов]}."""
+        order_ids = list(orders_products)
+        orders_matrix = np.zeros((len(order_ids), len(self.product_ids)), dtype=np.int32)
+        unavailable = np.zeros(len(order_ids), dtype=bool)
+        for row, order_id in enumerate(order_ids):
+            for product_id in orders_products[order_id]:
+                column = self.product_index.get(product_id)
+                if column is None:
+                    unavailable[row] = True
+                else:
+                    orders_matrix[row, column] = 1
+        missing_products = orders_matrix @ (~self.matrix).T.astype(np.int32)
+        capable = (missing_products == 0) & ~unavailable[:, np.newaxis]
+        return {
+            order_id: [self.restaurant_ids[column] for column in np.flatnonzero(capable[row])]
+            for row, order_id in enumerate(order_ids)
+        }
@@ -0,0 +1,189 @@
+import hashlib
+import time
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.templatetags.static import static
+from django.utils.encoding import filepath_to_uri
+
+from .models import Product, RestaurantMenuItem
+from .renderers import dumps_json
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_PRODUCTS_KEY = 'catalog:products:{}:{}'
+
+PRODUCT_FIELDS = [
+    'id',
+    'name',
+    'price',
+    'special_status',
+    'description',
+    'category',
+    'image',
+    'thumbnails',
+    'restaurants',
+]
+
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['version', 'body', 'next_cursor'])
+
+
+def make_catalog_version():
+    """Версия каталога — время изменения в микросекундах, из неё же берётся Last-Modified."""
+    return time.time_ns() // 1000
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, make_catalog_version(), None)
+
+
+def serialize_banners():
+    # FIXME move data to db?
+    return [
+        {
+            'title': 'Burger',
+            'src': static('burger.jpg'),
+            'text': 'Tasty Burger at your door step',
+        },
+        {
+            'title': 'Spices',
+            'src': static('food.jpg'),
+            'text': 'All Cuisines',
+        },
+        {
+            'title': 'New York',
+            'src': static('tasty.jpg'),
+            'text': 'Food is incomplete without a tasty dessert',
+        }
+    ]
+
+
+def parse_catalog_query(params):
+    """Проверяет параметры запроса каталога и приводит их к каноническому виду.
+
+    При ошибке в параметрах бросает ValueError с описанием.
+    """
+    query = {}
+    for name in ['restaurant', 'category', 'after', 'limit']:
+        value = params.get(name)
+        if value is None:
+            continue
+        if not value.isdigit():
+            raise ValueError(f'Параметр {name} должен быть целым числом')
+        query[name] = int(value)
+    if 'limit' in query:
+        query['limit'] = min(max(query['limit'], 1), settings.PRODUCTS_PAGE_MAX_SIZE)
+
+    special_status = params.get('special_status')
+    if special_status is not None:
+        if special_status.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError('Параметр special_status должен быть true или false')
+        query['special_status'] = special_status.lower() in ('true', '1')
+
+    fields = params.get('fields')
+    if fields is not None:
+        fields = set(fields.split(','))
+        unknown = fields - set(PRODUCT_FIELDS)
+        if unknown:
+            raise ValueError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+        query['fields'] = ','.join(field for field in PRODUCT_FIELDS if field in fields)
+    return query
+
+
+def serialize_products(query=None):
+    """Товары каталога, готовые к сериализации без дополнительных преобразований.
+
+    Цены сразу превращаются в строки, а адреса картинок собираются из
+    MEDIA_URL, чтобы не дёргать хранилище файлов на каждый товар.
+    Товары отсортированы по id, `after` и `limit` из запроса задают
+    страницу. Возвращает (товары, курсор следующей страницы или None).
+    """
+    query = query or {}
+    fields = query['fields'].split(',') if 'fields' in query else PRODUCT_FIELDS
+
+    products = Product.objects.select_related('category').order_by('id')
+    if 'restaurant' in query:
+        products = products.filter(
+            menu_items__restaurant=query['restaurant'],
+            menu_items__availability=True,
+        )
+    else:
+        products = products.available()
+    if 'category' in query:
+        products = products.filter(category=query['category'])
+    if 'special_status' in query:
+        products = products.filter(special_status=query['special_status'])
+    if 'after' in query:
+        products = products.filter(id__gt=query['after'])
+    if 'restaurants' in fields:
+        products = products.prefetch_related(Prefetch(
+            'menu_items',
+            queryset=RestaurantMenuItem.objects.filter(availability=True).select_related('restaurant'),
+            to_attr='available_menu_items',
+        ))
+    if 'limit' in query:
+        products = products[:query['limit'] + 1]
+
+    products = list(products)
+    next_cursor = None
+    if 'limit' in query and len(products) > query['limit']:
+        products = products[:query['limit']]
+        next_cursor = products[-1].id
+
+    dumped_products = []
+    for product in products:
+        dumped_product = {
+            'id': product.id,
+            'name': product.name,
+            'price': str(product.price),
+            'special_status': product.special_status,
+            'description': product.description,
+            'category': {
+                'id': product.category.id,
+                'name': product.category.name,
+            } if product.category else None,
+            'image': f'{settings.MEDIA_URL}{filepath_to_uri(product.image.name)}',
+            'thumbnails': product.thumbnail_urls(),
+        }
+        if 'restaurants' in fields:
+            dumped_product['restaurants'] = [
+                {
+                    'id': menu_item.restaurant.id,
+                    'name': menu_item.restaurant.name,
+                }
+                for menu_item in product.available_menu_items
+            ]
+        dumped_products.append({field: dumped_product[field] for field in fields})
+    return dumped_products, next_cursor
+
+
+def get_product_catalog(query=None):
+    """Сериализованный каталог товаров текущей версии.
+
+    Версия и готовые байты каталога читаются из кэша одним запросом.
+    Каждый набор параметров кэшируется отдельно. Если каталог изменился,
+    пока его собирали заново, он сохраняется под старой версией, и
+    следующий запрос соберёт его ещё раз.
+    """
+    query = query or {}
+    query_digest = hashlib.md5(urlencode(sorted(query.items())).encode()).hexdigest()
+    products_key = CATALOG_PRODUCTS_KEY.format(
+        'compact' if settings.API_COMPACT_JSON else 'pretty',
+        query_digest,
+    )
+    cached = cache.get_many([CATALOG_VERSION_KEY, products_key])
+    version = cached.get(CATALOG_VERSION_KEY)
+    snapshot = cached.get(products_key)
+    if version is not None and snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, make_catalog_version(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    products, next_cursor = serialize_products(query)
+    snapshot = CatalogSnapshot(version, dumps_json(products), next_cursor)
+    cache.set(products_key, snapshot, settings.CATALOG_CACHE_TIMEOUT)
+    return snapshot
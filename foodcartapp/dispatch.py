@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, OrderCandidate, Restaurant, RestaurantLoad
+
+
+def plan_assignment(candidates, capacity):
+    """Распределяет заказы по ресторанам, стараясь минимизировать суммарное расстояние.
+
+    `candidates` — {заказ: [(ресторан, км)]}, `capacity` — {ресторан: свободных мест}.
+    Сначала пары заказ–ресторан назначаются жадно от самых близких.
+    Затем каждый оставшийся без ресторана заказ пробует занять место в
+    заполненном ресторане, переселив оттуда другой заказ в ресторан со
+    свободным местом, если суммарное расстояние при этом растёт меньше всего.
+    Возвращает {заказ: ресторан}; заказы, которым места не нашлось, в ответ не попадают.
+    """
+    distances = {
+        order_id: dict(order_candidates)
+        for order_id, order_candidates in candidates.items()
+    }
+    free = Counter(capacity)
+    assignment = {}
+    pairs = sorted(
+        (km, order_id, restaurant_id)
+        for order_id, order_candidates in candidates.items()
+        for restaurant_id, km in order_candidates
+    )
+    for km, order_id, restaurant_id in pairs:
+        if order_id in assignment or free[restaurant_id] <= 0:
+            continue
+        assignment[order_id] = restaurant_id
+        free[restaurant_id] -= 1
+
+    assigned_to = defaultdict(set)
+    for order_id, restaurant_id in assignment.items():
+        assigned_to[restaurant_id].add(order_id)
+
+    for order_id in sorted(set(candidates) - set(assignment)):
+        best = None
+        for restaurant_id, km in candidates[order_id]:
+            for moved_order_id in assigned_to[restaurant_id]:
+                for new_restaurant_id, new_km in candidates[moved_order_id]:
+                    if free[new_restaurant_id] <= 0:
+                        continue
+                    cost = km + new_km - distances[moved_order_id][restaurant_id]
+                    if best is None or cost < best[0]:
+                        best = (cost, restaurant_id, moved_order_id, new_restaurant_id)
+        if best is None:
+            continue
+        _, restaurant_id, moved_order_id, new_restaurant_id = best
+        assigned_to[restaurant_id].remove(moved_order_id)
+        assigned_to[restaurant_id].add(order_id)
+        assigned_to[new_restaurant_id].add(moved_order_id)
+        assignment[order_id] = restaurant_id
+        assignment[moved_order_id] = new_restaurant_id
+        free[new_restaurant_id] -= 1
+    return assignment
+
+
+def get_free_capacity():
+    kitchen_load = RestaurantLoad.objects.kitchen_load()
+    return {
+        restaurant_id: max(capacity - kitchen_load.get(restaurant_id, 0), 0)
+        for restaurant_id, capacity in Restaurant.objects.values_list('id', 'capacity')
+    }
+
+
+def dispatch_orders(dry_run=False):
+    """Назначает рестораны необработанным заказам и переводит их в статус «Готовится».
+
+    Как и при ручном переходе, заполняется время звонка, если его ещё нет.
+
+    Учитываются только кандидаты с известным расстоянием: заказы, для
+    которых координаты ещё не определены, остаются менеджеру.
+    Возвращает {заказ: ресторан} для назначенных заказов.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Order.UNHANDLED, assigned_at__isnull=True)
+            .only('id')
+        )
+        candidates = defaultdict(list)
+        order_candidates = (
+            OrderCandidate.objects
+            .filter(order__in=orders, distance_km__isnull=False)
+            .values_list('order_id', 'restaurant_id', 'distance_km')
+        )
+        for order_id, restaurant_id, distance_km in order_candidates:
+            candidates[order_id].append((restaurant_id, distance_km))
+        assignment = plan_assignment(candidates, get_free_capacity())
+        if dry_run:
+            return assignment
+
+        now = timezone.now()
+        assigned_orders = [order for order in orders if order.id in assignment]
+        for order in assigned_orders:
+            order.assigned_at_id = assignment[order.id]
+            order.status = Order.PREPARING
+            order.updated_at = now
+            order.called_at = Coalesce(F('called_at'), now)
+            order.version = F('version') + 1
+        Order.objects.bulk_update(assigned_orders, ['assigned_at', 'status', 'updated_at', 'called_at', 'version'])
+        OrderCandidate.objects.filter(order__in=assigned_orders).delete()
+        RestaurantLoad.objects.shift(Counter(
+            (restaurant_id, Order.PREPARING)
+            for restaurant_id in assignment.values()
+        ))
+    return assignment
@@ -0,0 +1,58 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from foodcartapp.renderers import dumps_json
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает прежнюю и компактную сериализацию каталога товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        products = [
+            {
+                'id': product_id,
+                'name': f'Бургер №{product_id}',
+                'price': Decimal(rnd.randint(100, 900)).quantize(Decimal('0.01')),
+                'special_status': rnd.random() < 0.1,
+                'description': 'Сочная котлета, свежие овощи и фирменный соус. ' * 3,
+                'category': {'id': product_id % 7, 'name': 'Бургеры'},
+                'image': f'products/burger-{product_id}.jpg',
+                'restaurants': [{'id': product_id % 5, 'name': f'Ресторан №{product_id % 5}'}],
+            }
+            for product_id in range(options['products'])
+        ]
+
+        def encode_legacy():
+            data = [
+                {**product, 'image': default_storage.url(product['image'])}
+                for product in products
+            ]
+            return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=4).encode()
+
+        media_url = default_storage.url('')
+
+        def encode_compact():
+            data = [
+                {**product, 'price': str(product['price']), 'image': f"{media_url}{product['image']}"}
+                for product in products
+            ]
+            return dumps_json(data, compact=True)
+
+        for title, encode in [('indent=4, DjangoJSONEncoder', encode_legacy), ('компактный', encode_compact)]:
+            started_at = time.perf_counter()
+            for _ in range(options['repeat']):
+                body = encode()
+            seconds = (time.perf_counter() - started_at) / options['repeat']
+            self.stdout.write(f'{title}: {seconds * 1000:.2f} мс, {len(body)} байт')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.dispatch import dispatch_orders
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Назначает рестораны необработанным заказам с учётом загрузки ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать назначения, не сохраняя их',
+        )
+
+    def handle(self, *args, **options):
+        assignment = dispatch_orders(dry_run=options['dry_run'])
+        for order_id, restaurant_id in sorted(assignment.items()):
+            self.stdout.write(f'Заказ {order_id} -> ресторан {restaurant_id}')
+        unassigned = Order.objects.filter(status=Order.UNHANDLED).count()
+        if options['dry_run']:
+            unassigned -= len(assignment)
+        self.stdout.write(self.style.SUCCESS(
+            f'Назначено заказов: {len(assignment)}, осталось без ресторана: {unassigned}'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Product, RestaurantMenuItem
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает планы и время запроса доступных товаров через IN и через EXISTS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Выполнить запросы и показать фактический план (EXPLAIN ANALYZE, только PostgreSQL)',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        in_subquery = Product.objects.filter(
+            pk__in=RestaurantMenuItem.objects.filter(availability=True).values_list('product')
+        )
+        exists_subquery = Product.objects.available()
+        explain_options = {'analyze': True} if options['analyze'] else {}
+
+        for title, products in [('IN (подзапрос)', in_subquery), ('EXISTS', exists_subquery)]:
+            started_at = time.perf_counter()
+            for _ in range(options['repeat']):
+                count = len(list(products.values_list('id', flat=True)))
+            seconds = (time.perf_counter() - started_at) / options['repeat']
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{title}: {count} товаров, {seconds * 1000:.2f} мс'))
+            self.stdout.write(products.explain(**explain_options))
@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from foodcartapp.catalog import bump_catalog_version
+from foodcartapp.models import Product
+from foodcartapp.thumbnails import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок товаров, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов, по умолчанию по числу ядер',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех товаров',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Сколько готовых товаров отмечать в базе за раз',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['all']:
+            products = products.filter(has_thumbnails=False)
+        images = dict(products.values_list('id', 'image'))
+        self.stdout.write(f'Товаров для обработки: {len(images)}')
+        if not images:
+            return
+
+        done = []
+        errors = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            futures = {
+                executor.submit(make_thumbnails, image_name): product_id
+                for product_id, image_name in images.items()
+            }
+            for future in as_completed(futures):
+                product_id = futures[future]
+                try:
+                    future.result()
+                except OSError as error:
+                    errors += 1
+                    self.stderr.write(f'Товар {product_id}: {error}')
+                    continue
+                done.append(product_id)
+                if len(done) >= options['chunk_size']:
+                    Product.objects.filter(pk__in=done).update(has_thumbnails=True)
+                    done = []
+        Product.objects.filter(pk__in=done).update(has_thumbnails=True)
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обработано {len(images) - errors} товаров, ошибок: {errors}'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.snapshots import publish_catalog_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Выкладывает в STATIC_ROOT готовые products.json и banners.json для раздачи через nginx'
+
+    def handle(self, *args, **options):
+        for path in publish_catalog_snapshots():
+            self.stdout.write(f'Опубликован {path}')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сохранённую стоимость заказов с суммой по их пунктам и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        mismatched = list(
+            Order.objects
+            .with_computed_total()
+            .exclude(total_price=F('computed_total'))
+            .only('id', 'total_price')
+        )
+        for order in mismatched:
+            self.stdout.write(f'{order}: сохранено {order.total_price}, по пунктам {order.computed_total}')
+        if options['check']:
+            if mismatched:
+                self.stderr.write(f'Расхождений: {len(mismatched)}')
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        now = timezone.now()
+        for order in mismatched:
+            order.total_price = order.computed_total
+            order.updated_at = now
+        Order.objects.bulk_update(mismatched, ['total_price', 'updated_at'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено заказов: {len(mismatched)}'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from foodcartapp.models import Order, RestaurantLoad
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики загрузки ресторанов с заказами и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        actual = {
+            (restaurant_id, status): orders_count
+            for restaurant_id, status, orders_count in (
+                Order.objects
+                .filter(assigned_at__isnull=False, status__in=Order.ACTIVE_STATUSES)
+                .values_list('assigned_at', 'status')
+                .annotate(orders_count=Count('id'))
+            )
+        }
+        loads = {
+            (load.restaurant_id, load.status): load
+            for load in RestaurantLoad.objects.all()
+        }
+        mismatched = []
+        for key in set(actual) | set(loads):
+            load = loads.get(key) or RestaurantLoad(restaurant_id=key[0], status=key[1])
+            if load.orders_count == actual.get(key, 0):
+                continue
+            self.stdout.write(
+                f'Ресторан {key[0]}, {key[1]}: в счётчике {load.orders_count}, по заказам {actual.get(key, 0)}'
+            )
+            load.orders_count = actual.get(key, 0)
+            mismatched.append(load)
+        if options['check']:
+            if mismatched:
+                self.stderr.write(f'Расхождений: {len(mismatched)}')
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        RestaurantLoad.objects.bulk_update([load for load in mismatched if load.pk], ['orders_count'])
+        RestaurantLoad.objects.bulk_create([load for load in mismatched if not load.pk])
+        self.stdout.write(self.style.SUCCESS(f'Исправлено счётчиков: {len(mismatched)}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.candidates import refresh_candidates
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рестораны-кандидаты для всех необработанных заказов'
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(status=Order.UNHANDLED)
+        refresh_candidates(orders)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитаны кандидаты для {orders.count()} заказов'))
@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+from location.address import normalize_address
+
+
+def fill_normalized_address(apps, schema_editor):
+    for model_name in ['Order', 'Restaurant']:
+        Model = apps.get_model('foodcartapp', model_name)
+        objs = []
+        for obj in Model.objects.only('id', 'address').iterator(chunk_size=200):
+            obj.normalized_address = normalize_address(obj.address)
+            objs.append(obj)
+        Model.objects.bulk_update(objs, ['normalized_address'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0050_auto_20220815_0902'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='normalized_address',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200, verbose_name='Нормализованный адрес доставки'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='normalized_address',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, verbose_name='нормализованный адрес'),
+        ),
+        migrations.RunPython(fill_normalized_address, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2 on 2026-10-18 19:37
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_normalized_address'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время создания заказа'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='payment_method',
+            field=models.CharField(choices=[('online', 'Онлайн'), ('cash', 'Наличными'), ('not_defined', 'Не указано')], db_index=True, default='not_defined', max_length=20, verbose_name='Способ оплаты'),
+        ),
+        migrations.AlterField(
+            model_name='orderelement',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='elements', to='foodcartapp.product', verbose_name='продукт'),
+        ),
+        migrations.AlterField(
+            model_name='orderelement',
+            name='quantity',
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Количество'),
+        ),
+        migrations.CreateModel(
+            name='OrderCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(blank=True, null=True, verbose_name='расстояние, км')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='место в списке')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='foodcartapp.order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_candidates', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'ресторан-кандидат',
+                'verbose_name_plural': 'рестораны-кандидаты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ordercandidate',
+            index=models.Index(fields=['order', 'rank'], name='foodcartapp_order_i_7f08f5_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ordercandidate',
+            unique_together={('order', 'restaurant')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 19:38
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    orders = []
+    totals = Order.objects.annotate(computed_total=Sum(F('elements__price') * F('elements__quantity')))
+    for order in totals.only('id').iterator(chunk_size=200):
+        order.total_price = order.computed_total or 0
+        orders.append(order)
+    Order.objects.bulk_update(orders, ['total_price'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_ordercandidate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Стоимость заказа'),
+        ),
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+    ]
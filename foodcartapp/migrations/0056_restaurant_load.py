@@ -0,0 +1,50 @@
+# Generated by Django 3.2 on 2026-10-18 19:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_restaurant_load(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    RestaurantLoad = apps.get_model('foodcartapp', 'RestaurantLoad')
+    counts = (
+        Order.objects
+        .filter(assigned_at__isnull=False, status__in=['Unhandled', 'Preparing', 'Delivering'])
+        .values_list('assigned_at', 'status')
+        .annotate(orders_count=Count('id'))
+    )
+    RestaurantLoad.objects.bulk_create([
+        RestaurantLoad(restaurant_id=restaurant_id, status=status, orders_count=orders_count)
+        for restaurant_id, status, orders_count in counts
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=10, help_text='сколько заказов ресторан может готовить одновременно', verbose_name='вместимость кухни'),
+        ),
+        migrations.CreateModel(
+            name='RestaurantLoad',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Unhandled', 'Необработанный'), ('Preparing', 'Готовится'), ('Delivering', 'Доставляется'), ('Finished', 'Завершенный')], max_length=20, verbose_name='статус заказов')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='количество заказов')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loads', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'загрузка ресторана',
+                'verbose_name_plural': 'загрузка ресторанов',
+                'unique_together': {('restaurant', 'status')},
+            },
+        ),
+        migrations.RunPython(fill_restaurant_load, migrations.RunPython.noop),
+    ]
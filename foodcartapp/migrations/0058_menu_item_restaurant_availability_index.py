@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0057_order_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(fields=['restaurant', 'availability'], name='foodcartapp_restaur_f18bef_idx'),
+        ),
+    ]
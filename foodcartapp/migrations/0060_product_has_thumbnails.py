@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_menu_item_product_availability_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='has_thumbnails',
+            field=models.BooleanField(default=False, editable=False, verbose_name='уменьшенные копии картинки готовы'),
+        ),
+    ]
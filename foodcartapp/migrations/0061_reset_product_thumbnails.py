@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def reset_thumbnails(apps, schema_editor):
+    # Имена уменьшенных копий теперь включают расширение оригинала,
+    # копии под старыми именами нужно пересоздать командой make_thumbnails.
+    Product = apps.get_model('foodcartapp', 'Product')
+    Product.objects.filter(has_thumbnails=True).update(has_thumbnails=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0060_product_has_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_thumbnails, migrations.RunPython.noop),
+    ]
@@ -1,25 +1,69 @@
-from django.db import models
-from django.db.models import F, Sum, OuterRef, Subquery
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, OuterRef, Subquery, Exists, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
+from location.address import normalize_address
 from location.models import Location
 
+from .thumbnails import FORMATS, RENDITION_WIDTHS, get_thumbnail_urls
+
+
+class LoadedValuesMixin:
+    """Помнит значения полей на момент загрузки из базы или последнего сохранения.
+
+    Обработчики post_save по ним понимают, какие поля действительно
+    изменились, и не пересчитывают зависимые данные зря.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            field_name: value
+            for field_name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def get_loaded_value(self, field_name, default=None):
+        return getattr(self, '_loaded_values', {}).get(field_name, default)
+
+    def has_changed(self, *field_names):
+        """Изменилось ли хоть одно из полей; у ещё не загруженной модели — всегда да."""
+        loaded_values = getattr(self, '_loaded_values', {})
+        return any(
+            field_name not in loaded_values or loaded_values[field_name] != getattr(self, field_name)
+            for field_name in field_names
+        )
+
 
 class RestaurantQuerySet(models.QuerySet):
     def with_coordinates(self):
-        location = Location.objects.filter(address=OuterRef('address'))
+        location = Location.objects.filter(normalized_address=OuterRef('normalized_address'))
         return(
             self
             .annotate(
                 longitude=Subquery(location.values('longitude')[:1]),
-                latitude=Subquery(location.values('latitude')[:1])
+                latitude=Subquery(location.values('latitude')[:1]),
+                geocoded=Exists(location),
             )
         )
 
+    def near(self, point, radius_km):
+        locations = Location.objects.near(point, radius_km).values('normalized_address')
+        return self.filter(normalized_address__in=locations)
 
-class Restaurant(models.Model):
+
+class Restaurant(LoadedValuesMixin, models.Model):
     name = models.CharField(
         'название',
         max_length=50
@@ -29,11 +73,23 @@ class Restaurant(models.Model):
         max_length=100,
         blank=True,
     )
+    normalized_address = models.CharField(
+        'нормализованный адрес',
+        max_length=200,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
     contact_phone = models.CharField(
         'контактный телефон',
         max_length=50,
         blank=True,
     )
+    capacity = models.PositiveSmallIntegerField(
+        'вместимость кухни',
+        default=10,
+        help_text='сколько заказов ресторан может готовить одновременно',
+    )
 
     objects = RestaurantQuerySet.as_manager()
 
@@ -44,15 +100,18 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+        menu_items = RestaurantMenuItem.objects.filter(
+            product=OuterRef('pk'),
+            availability=True,
         )
-        return self.filter(pk__in=products)
+        return self.filter(Exists(menu_items))
 
 
 class ProductCategory(models.Model):
@@ -101,6 +160,11 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    has_thumbnails = models.BooleanField(
+        'уменьшенные копии картинки готовы',
+        default=False,
+        editable=False,
+    )
 
     objects = ProductQuerySet.as_manager()
 
@@ -111,8 +175,17 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    def thumbnail_urls(self):
+        """Адреса уменьшенных копий картинки; пока их нет — адрес оригинала во всех вариантах."""
+        if self.has_thumbnails:
+            return get_thumbnail_urls(self.image.name)
+        return {
+            rendition: {image_format: self.image.url for image_format in FORMATS}
+            for rendition in RENDITION_WIDTHS
+        }
 
-class RestaurantMenuItem(models.Model):
+
+class RestaurantMenuItem(LoadedValuesMixin, models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
         related_name='menu_items',
@@ -137,6 +210,10 @@ class RestaurantMenuItem(models.Model):
         unique_together = [
             ['restaurant', 'product']
         ]
+        indexes = [
+            models.Index(fields=['restaurant', 'availability']),
+            models.Index(fields=['product', 'availability']),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
@@ -144,18 +221,29 @@ class RestaurantMenuItem(models.Model):
 
 class OrderQuerySet(models.QuerySet):
     def add_full_price(self):
-        return (
-            self
-            .annotate(full_price=Sum(F('elements__price') * F('elements__quantity')))
+        return self.annotate(full_price=F('total_price'))
+
+    def after_cursor(self, status, order_id):
+        """Заказы, идущие после (status, id) при сортировке по убыванию обоих полей."""
+        return self.filter(Q(status__lt=status) | Q(status=status, id__lt=order_id))
+
+    def with_computed_total(self):
+        return self.annotate(
+            computed_total=Coalesce(
+                Sum(F('elements__price') * F('elements__quantity')),
+                Value(0),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
         )
 
     def with_coordinates(self):
-        location = Location.objects.filter(address=OuterRef('address'))
+        location = Location.objects.filter(normalized_address=OuterRef('normalized_address'))
         return(
             self
             .annotate(
                 longitude=Subquery(location.values('longitude')[:1]),
-                latitude=Subquery(location.values('latitude')[:1])
+                latitude=Subquery(location.values('latitude')[:1]),
+                geocoded=Exists(location),
             )
         )
 
@@ -170,6 +258,7 @@ class Order(models.Model):
         (DELIVERING, 'Доставляется'),
         (FINISHED, 'Завершенный'),
     ]
+    ACTIVE_STATUSES = [UNHANDLED, PREPARING, DELIVERING]
     ONLINE = 'online'
     CASH = 'cash'
     ND = 'not_defined'
@@ -198,6 +287,12 @@ class Order(models.Model):
         max_length=100,
         db_index=True,
     )
+    normalized_address = models.CharField(
+        'Нормализованный адрес доставки',
+        max_length=200,
+        db_index=True,
+        editable=False,
+    )
 
     status = models.CharField(
         'Статус заказа',
@@ -242,16 +337,62 @@ class Order(models.Model):
         null=True,
         blank=True,
     )
+    total_price = models.DecimalField(
+        'Стоимость заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'Время последнего изменения',
+        auto_now=True,
+        db_index=True,
+    )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False,
+    )
 
     objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
 
     def __str__(self):
         return f"Заказ {self.id}"
 
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        with transaction.atomic():
+            old_state = None
+            if self.pk:
+                old_state = (
+                    Order.objects
+                    .select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list('assigned_at_id', 'status', 'version')
+                    .first()
+                )
+            if old_state:
+                self.version = old_state[2] + 1
+            super().save(*args, **kwargs)
+            changes = Counter({(self.assigned_at_id, self.status): 1})
+            if old_state:
+                changes[old_state[:2]] -= 1
+            RestaurantLoad.objects.shift(changes)
+            if old_state and old_state[1] == Order.UNHANDLED and self.status != Order.UNHANDLED:
+                OrderCandidate.objects.filter(order=self).delete()
+
+    def update_total_price(self):
+        self.total_price = Order.objects.with_computed_total().get(pk=self.pk).computed_total
+        Order.objects.filter(pk=self.pk).update(total_price=self.total_price, updated_at=timezone.now())
+
 
 class OrderElement(models.Model):
     product = models.ForeignKey(
@@ -287,3 +428,96 @@ class OrderElement(models.Model):
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} шт."
+
+
+class OrderCandidate(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='candidates',
+        verbose_name='заказ',
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='order_candidates',
+        verbose_name='ресторан',
+    )
+    distance_km = models.FloatField(
+        'расстояние, км',
+        null=True,
+        blank=True,
+    )
+    rank = models.PositiveSmallIntegerField(
+        'место в списке',
+    )
+
+    class Meta:
+        verbose_name = 'ресторан-кандидат'
+        verbose_name_plural = 'рестораны-кандидаты'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(fields=['order', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.order} - {self.restaurant.name}"
+
+
+class RestaurantLoadQuerySet(models.QuerySet):
+    def shift(self, changes):
+        """Сдвигает счётчики на {(ресторан, статус): изменение} условными UPDATE.
+
+        Пары без ресторана и с неактивным статусом пропускаются. Счётчик
+        не уходит в минус: уменьшение, которое сделало бы его
+        отрицательным, не применяется.
+        """
+        for (restaurant_id, status), delta in changes.items():
+            if not delta or restaurant_id is None or status not in Order.ACTIVE_STATUSES:
+                continue
+            loads = self.filter(restaurant_id=restaurant_id, status=status)
+            if delta < 0:
+                loads.filter(orders_count__gte=-delta).update(orders_count=F('orders_count') + delta)
+            elif not loads.update(orders_count=F('orders_count') + delta):
+                self.get_or_create(restaurant_id=restaurant_id, status=status)
+                loads.update(orders_count=F('orders_count') + delta)
+
+    def kitchen_load(self):
+        """{ресторан: сколько заказов в нём сейчас готовится}."""
+        return dict(
+            self
+            .filter(status=Order.PREPARING)
+            .values_list('restaurant_id', 'orders_count')
+        )
+
+
+class RestaurantLoad(models.Model):
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='loads',
+        verbose_name='ресторан',
+    )
+    status = models.CharField(
+        'статус заказов',
+        max_length=20,
+        choices=Order.STATUS_CHOICES,
+    )
+    orders_count = models.PositiveIntegerField(
+        'количество заказов',
+        default=0,
+    )
+
+    objects = RestaurantLoadQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'загрузка ресторана'
+        verbose_name_plural = 'загрузка ресторанов'
+        unique_together = [
+            ['restaurant', 'status']
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant.name} - {self.get_status_display()}: {self.orders_count}"
@@ -0,0 +1,25 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+
+def dumps_json(data, compact=None):
+    """Сериализует ответ API в байты.
+
+    Компактный режим пишет JSON без отступов и пробелов: тогда работает
+    сишный кодировщик модуля json, а DjangoJSONEncoder вызывается только
+    для значений, которые сериализаторы не привели к строкам и числам
+    заранее. С отступами json кодирует на чистом Python, поэтому
+    человекочитаемый вывод включён только для отладки.
+    """
+    if compact is None:
+        compact = settings.API_COMPACT_JSON
+    if compact:
+        return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=4).encode()
+
+
+def json_response(data, **kwargs):
+    return HttpResponse(dumps_json(data), content_type='application/json', **kwargs)
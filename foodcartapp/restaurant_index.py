@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from location.cache import location_cache
+from location.spatial import GridIndex
+
+from .models import Restaurant
+
+
+VERSION_KEY = 'restaurant_index:version'
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_restaurant_index():
+    """Индекс ресторанов по координатам, общий для всех запросов процесса.
+
+    Перестраивается, когда другой процесс поднял версию через
+    invalidate_restaurant_index().
+    """
+    global _index, _index_version
+    version = cache.get_or_set(VERSION_KEY, make_index_version, None)
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = build_restaurant_index()
+            _index_version = version
+        return _index
+
+
+def build_restaurant_index():
+    restaurants = list(Restaurant.objects.exclude(address=''))
+    coordinates = location_cache.get_many({restaurant.address for restaurant in restaurants})
+    points = {}
+    for restaurant in restaurants:
+        location = coordinates.get(restaurant.address)
+        if location and location.longitude is not None:
+            points[restaurant.id] = (location.longitude, location.latitude)
+    return GridIndex(points, cell_km=settings.RESTAURANT_INDEX_CELL_KM)
+
+
+def make_index_version():
+    """Версия индекса — время в наносекундах.
+
+    Даже если ключ вытеснят из кэша, новая версия не совпадёт с той,
+    что уже держит какой-нибудь процесс.
+    """
+    return time.time_ns()
+
+
+def invalidate_restaurant_index():
+    cache.set(VERSION_KEY, make_index_version(), None)
@@ -0,0 +1,123 @@
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from location.distances import haversine_matrix, to_array
+
+from .models import Order, Restaurant
+
+
+CourierBatch = namedtuple('CourierBatch', ['restaurant', 'orders', 'distance_km'])
+
+
+def cluster_points(points, times, radius_km, window, max_size):
+    """Группирует точки в пачки для одного курьера.
+
+    Пачка начинается с самой ранней ещё не распределённой точки и
+    добирает ближайшие к ней точки не дальше `radius_km`, время которых
+    отличается не больше чем на `window`, пока в пачке не станет
+    `max_size` точек. Точки без координат остаются по одной.
+    Возвращает списки индексов точек.
+    """
+    coordinates = to_array(points)
+    distances = haversine_matrix(coordinates, coordinates)
+    unassigned = np.ones(len(points), dtype=bool)
+    batches = []
+    for seed in sorted(range(len(points)), key=times.__getitem__):
+        if not unassigned[seed]:
+            continue
+        unassigned[seed] = False
+        batch = [seed]
+        if points[seed] is not None:
+            close = [
+                index
+                for index in np.argsort(distances[seed], kind='stable')
+                if unassigned[index]
+                and distances[seed, index] <= radius_km
+                and abs(times[index] - times[seed]) <= window
+            ]
+            batch += close[:max_size - 1]
+            unassigned[batch] = False
+        batches.append(batch)
+    return batches
+
+
+def route_length(route, distances):
+    return float(sum(distances[a, b] for a, b in zip(route, route[1:])))
+
+
+def plan_route(start, points):
+    """Порядок объезда точек из `start` без возврата обратно.
+
+    Маршрут строится жадно от ближайшей точки и затем улучшается
+    перестановками 2-opt. Возвращает (индексы точек по порядку, км).
+    """
+    distances = haversine_matrix(to_array([start] + points), to_array([start] + points))
+    route = [0]
+    left = set(range(1, len(points) + 1))
+    while left:
+        nearest = min(left, key=lambda index: distances[route[-1], index])
+        route.append(nearest)
+        left.remove(nearest)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(route) - 1):
+            for j in range(i + 1, len(route)):
+                removed = distances[route[i - 1], route[i]]
+                added = distances[route[i - 1], route[j]]
+                if j + 1 < len(route):
+                    removed += distances[route[j], route[j + 1]]
+                    added += distances[route[i], route[j + 1]]
+                if added < removed - 1e-9:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+    return [index - 1 for index in route[1:]], route_length(route, distances)
+
+
+def build_courier_batches():
+    """Пачки доставляемых заказов по ресторанам с маршрутом объезда."""
+    restaurants = {
+        restaurant.id: restaurant
+        for restaurant in Restaurant.objects.with_coordinates()
+    }
+    orders_by_restaurant = defaultdict(list)
+    orders = (
+        Order.objects
+        .filter(status=Order.DELIVERING, assigned_at__isnull=False)
+        .with_coordinates()
+        .order_by('created_at')
+    )
+    for order in orders:
+        orders_by_restaurant[order.assigned_at_id].append(order)
+
+    batches = []
+    for restaurant_id, restaurant_orders in orders_by_restaurant.items():
+        restaurant = restaurants[restaurant_id]
+        points = [
+            (order.longitude, order.latitude) if order.longitude is not None else None
+            for order in restaurant_orders
+        ]
+        clusters = cluster_points(
+            points,
+            [order.created_at for order in restaurant_orders],
+            radius_km=settings.COURIER_BATCH_RADIUS_KM,
+            window=settings.COURIER_BATCH_WINDOW,
+            max_size=settings.COURIER_BATCH_SIZE,
+        )
+        for cluster in clusters:
+            if restaurant.longitude is None or points[cluster[0]] is None:
+                batches.append(CourierBatch(restaurant, [restaurant_orders[index] for index in cluster], None))
+                continue
+            route, distance_km = plan_route(
+                (restaurant.longitude, restaurant.latitude),
+                [points[index] for index in cluster],
+            )
+            batches.append(CourierBatch(
+                restaurant,
+                [restaurant_orders[cluster[index]] for index in route],
+                distance_km,
+            ))
+    return batches
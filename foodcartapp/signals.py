@@ -0,0 +1,141 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from location.cache import location_cache
+from location.models import Location
+
+from .candidates import refresh_candidates
+from .catalog import bump_catalog_version
+from .models import Order, Product, ProductCategory, Restaurant, RestaurantLoad, RestaurantMenuItem
+from .restaurant_index import invalidate_restaurant_index
+from .snapshots import publish_catalog_snapshots
+
+
+def on_commit_once(func):
+    """Откладывает func до коммита, если она ещё не ждёт коммита этой транзакции.
+
+    Админка сохраняет ресторан и все пункты его меню одной транзакцией,
+    и без этой проверки каталог пересобирался бы после каждого из них.
+    """
+    connection = transaction.get_connection()
+    if any(entry[1] is func for entry in connection.run_on_commit):
+        return
+    transaction.on_commit(func)
+
+
+class CandidatesRefresh:
+    """Пересчёт ресторанов-кандидатов, накопленный за транзакцию.
+
+    Выполняется один раз после коммита: для всех заказов, если
+    поменялись адреса ресторанов, иначе — только для заказов с
+    затронутыми продуктами и адресами.
+    """
+
+    def __init__(self):
+        self.all_orders = False
+        self.product_ids = set()
+        self.normalized_addresses = set()
+
+    def __call__(self):
+        if self.all_orders:
+            invalidate_restaurant_index()
+            refresh_candidates(Order.objects.all())
+            return
+        refresh_candidates(
+            Order.objects
+            .filter(
+                Q(elements__product_id__in=self.product_ids)
+                | Q(normalized_address__in=self.normalized_addresses)
+            )
+            .distinct()
+        )
+
+
+def schedule_candidates_refresh(all_orders=False, product_ids=(), normalized_addresses=()):
+    connection = transaction.get_connection()
+    pending = next(
+        (entry[1] for entry in connection.run_on_commit if isinstance(entry[1], CandidatesRefresh)),
+        None,
+    )
+    is_new = pending is None
+    if is_new:
+        pending = CandidatesRefresh()
+    pending.all_orders |= all_orders
+    pending.product_ids.update(product_ids)
+    pending.normalized_addresses.update(normalized_addresses)
+    # Вне транзакции on_commit вызывает функцию сразу, поэтому
+    # регистрировать её можно только уже заполненной.
+    if is_new:
+        transaction.on_commit(pending)
+
+
+@receiver(post_save, sender=Restaurant)
+def handle_restaurant_save(sender, instance, created, **kwargs):
+    # Название, телефон и вместимость на кандидатов не влияют.
+    if created or instance.has_changed('address'):
+        schedule_candidates_refresh(all_orders=True)
+
+
+@receiver(post_delete, sender=Restaurant)
+def handle_restaurant_delete(sender, instance, **kwargs):
+    schedule_candidates_refresh(all_orders=True)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def handle_location_change(sender, instance, **kwargs):
+    # Обработчики приложения location могут сработать позже этого,
+    # а кандидатов нужно считать по уже новым координатам.
+    location_cache.invalidate([instance.normalized_address])
+    if Restaurant.objects.filter(normalized_address=instance.normalized_address).exists():
+        schedule_candidates_refresh(all_orders=True)
+    else:
+        schedule_candidates_refresh(normalized_addresses=[instance.normalized_address])
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def handle_menu_item_save(sender, instance, created, **kwargs):
+    if created:
+        if instance.availability:
+            schedule_candidates_refresh(product_ids=[instance.product_id])
+    elif instance.has_changed('availability', 'product_id', 'restaurant_id'):
+        schedule_candidates_refresh(product_ids={
+            instance.product_id,
+            instance.get_loaded_value('product_id', instance.product_id),
+        })
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def handle_menu_item_delete(sender, instance, **kwargs):
+    if instance.availability:
+        schedule_candidates_refresh(product_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def handle_catalog_change(sender, instance, **kwargs):
+    # Если сменить версию до коммита, каталог успеют пересобрать
+    # из старых данных и сохранить уже под новой версией.
+    on_commit_once(refresh_catalog)
+
+
+def refresh_catalog():
+    bump_catalog_version()
+    if settings.CATALOG_SNAPSHOTS_ON_CHANGE:
+        publish_catalog_snapshots()
+
+
+@receiver(post_delete, sender=Order)
+def handle_order_delete(sender, instance, **kwargs):
+    RestaurantLoad.objects.shift(Counter({(instance.assigned_at_id, instance.status): -1}))
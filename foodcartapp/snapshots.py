@@ -0,0 +1,50 @@
+import gzip
+import os
+import tempfile
+
+from django.conf import settings
+
+from .catalog import get_product_catalog, serialize_banners
+from .renderers import dumps_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def write_atomically(path, content):
+    """Записывает файл рядом во временный и подменяет им старый.
+
+    nginx в любой момент видит либо старую, либо новую версию файла
+    целиком, но не наполовину записанную.
+    """
+    directory = os.path.dirname(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def publish_snapshot(filename, content):
+    """Публикует файл в STATIC_ROOT вместе со сжатыми копиями для gzip_static и brotli_static."""
+    os.makedirs(settings.STATIC_ROOT, exist_ok=True)
+    path = os.path.join(settings.STATIC_ROOT, filename)
+    write_atomically(f'{path}.gz', gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli:
+        write_atomically(f'{path}.br', brotli.compress(content))
+    write_atomically(path, content)
+    return path
+
+
+def publish_catalog_snapshots():
+    """Выкладывает products.json и banners.json, которые отдают /api/products/ и /api/banners/."""
+    return [
+        publish_snapshot('products.json', get_product_catalog().body),
+        publish_snapshot('banners.json', dumps_json(serialize_banners())),
+    ]
@@ -0,0 +1,209 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .dispatch import plan_assignment
+from .models import Order, OrderCandidate, OrderElement, Product, Restaurant, RestaurantLoad, RestaurantMenuItem
+from .transitions import apply_transitions
+
+
+class AvailableProductsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        restaurant = Restaurant.objects.create(name='Star Burger Арбат')
+        other_restaurant = Restaurant.objects.create(name='Star Burger Центр')
+        cls.in_stock = Product.objects.create(name='Чизбургер', price=100)
+        cls.sold_out = Product.objects.create(name='Гамбургер', price=90)
+        cls.off_menu = Product.objects.create(name='Картофель фри', price=60)
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=cls.in_stock, availability=False)
+        RestaurantMenuItem.objects.create(restaurant=other_restaurant, product=cls.in_stock)
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=cls.sold_out, availability=False)
+
+    def test_returns_products_in_stock_anywhere_once(self):
+        self.assertQuerysetEqual(
+            Product.objects.available().order_by('id'),
+            [self.in_stock],
+        )
+
+    def test_compiles_to_correlated_exists(self):
+        sql = str(Product.objects.available().query)
+        self.assertIn('WHERE EXISTS(SELECT', sql)
+        self.assertIn(f'U0."product_id" = {connection.ops.quote_name(Product._meta.db_table)}."id"', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    @skipUnless(connection.vendor == 'sqlite', 'план запроса проверяется на SQLite')
+    def test_uses_product_availability_index(self):
+        index_name = next(
+            index.name
+            for index in RestaurantMenuItem._meta.indexes
+            if index.fields == ['product', 'availability']
+        )
+        plan = Product.objects.available().explain()
+        self.assertIn('CORRELATED SCALAR SUBQUERY', plan)
+        self.assertIn(f'USING COVERING INDEX {index_name}', plan)
+
+
+class ApplyTransitionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = Restaurant.objects.create(name='Star Burger Арбат')
+        product = Product.objects.create(name='Чизбургер', price=100)
+        RestaurantMenuItem.objects.create(restaurant=cls.restaurant, product=product)
+        cls.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79991234567',
+            address='Москва, Тверская 1',
+        )
+        OrderElement.objects.create(order=cls.order, product=product, quantity=1, price=100)
+
+    def get_state(self):
+        return Order.objects.values('status', 'version', 'assigned_at_id', 'called_at', 'delivered_at').get(pk=self.order.pk)
+
+    def test_applies_transition_with_matching_version(self):
+        applied, conflicts = apply_transitions([{
+            'order': self.order.pk,
+            'version': 1,
+            'status': Order.PREPARING,
+            'restaurant': self.restaurant.pk,
+        }])
+
+        self.assertEqual(conflicts, [])
+        self.assertEqual(applied, [{
+            'order': self.order.pk,
+            'status': Order.PREPARING,
+            'version': 2,
+            'restaurant': self.restaurant.pk,
+        }])
+        state = self.get_state()
+        self.assertEqual(state['status'], Order.PREPARING)
+        self.assertEqual(state['version'], 2)
+        self.assertEqual(state['assigned_at_id'], self.restaurant.pk)
+        self.assertIsNotNone(state['called_at'])
+        self.assertEqual(
+            RestaurantLoad.objects.kitchen_load(),
+            {self.restaurant.pk: 1},
+        )
+
+    def test_stale_version_is_conflict(self):
+        applied, conflicts = apply_transitions([{
+            'order': self.order.pk,
+            'version': 0,
+            'status': Order.PREPARING,
+            'restaurant': self.restaurant.pk,
+        }])
+
+        self.assertEqual(applied, [])
+        self.assertEqual(conflicts, [{
+            'order': self.order.pk,
+            'reason': 'conflict',
+            'status': Order.UNHANDLED,
+            'version': 1,
+            'restaurant': None,
+        }])
+        self.assertEqual(self.get_state()['version'], 1)
+
+    def test_unexpected_status_is_conflict(self):
+        applied, conflicts = apply_transitions([{
+            'order': self.order.pk,
+            'expected_status': Order.DELIVERING,
+            'status': Order.FINISHED,
+        }])
+
+        self.assertEqual(applied, [])
+        self.assertEqual(conflicts[0]['reason'], 'conflict')
+        self.assertIsNone(self.get_state()['delivered_at'])
+
+    def test_missing_order_is_reported(self):
+        applied, conflicts = apply_transitions([{'order': 0, 'status': Order.FINISHED}])
+
+        self.assertEqual(applied, [])
+        self.assertEqual(conflicts, [{'order': 0, 'reason': 'not_found'}])
+
+    def test_timestamps_are_filled_once(self):
+        called_at = timezone.now() - timedelta(hours=1)
+        Order.objects.filter(pk=self.order.pk).update(called_at=called_at)
+
+        apply_transitions([
+            {'order': self.order.pk, 'status': Order.PREPARING, 'restaurant': self.restaurant.pk},
+            {'order': self.order.pk, 'status': Order.FINISHED},
+        ])
+
+        state = self.get_state()
+        self.assertEqual(state['version'], 3)
+        self.assertEqual(state['called_at'], called_at)
+        self.assertIsNotNone(state['delivered_at'])
+
+    def test_candidates_are_rebuilt_when_order_returns_to_unhandled(self):
+        apply_transitions([{'order': self.order.pk, 'status': Order.PREPARING, 'restaurant': self.restaurant.pk}])
+        self.assertFalse(OrderCandidate.objects.filter(order=self.order).exists())
+
+        apply_transitions([{'order': self.order.pk, 'status': Order.UNHANDLED, 'restaurant': None}])
+
+        self.assertEqual(
+            list(OrderCandidate.objects.filter(order=self.order).values_list('restaurant_id', flat=True)),
+            [self.restaurant.pk],
+        )
+
+
+class PlanAssignmentTest(SimpleTestCase):
+    def test_assigns_nearest_restaurant_with_free_capacity(self):
+        assignment = plan_assignment(
+            {1: [(10, 1.0), (20, 3.0)], 2: [(20, 0.5)]},
+            {10: 1, 20: 1},
+        )
+        self.assertEqual(assignment, {1: 10, 2: 20})
+
+    def test_repair_moves_assigned_order_to_free_restaurant(self):
+        # Жадный шаг отдаёт единственное место в ресторане 10 заказу 1,
+        # и заказу 2, который может готовиться только там, места не остаётся.
+        # Заказ 1 переезжает в ресторан 20, освобождая место заказу 2.
+        assignment = plan_assignment(
+            {1: [(10, 1.0), (20, 2.0)], 2: [(10, 1.5)]},
+            {10: 1, 20: 1},
+        )
+        self.assertEqual(assignment, {1: 20, 2: 10})
+
+    def test_repair_picks_cheapest_move(self):
+        assignment = plan_assignment(
+            {
+                1: [(10, 1.0), (20, 5.0)],
+                2: [(10, 1.2), (30, 1.4)],
+                3: [(10, 1.5)],
+            },
+            {10: 2, 20: 1, 30: 1},
+        )
+        self.assertEqual(assignment, {1: 10, 2: 30, 3: 10})
+
+    def test_orders_without_room_stay_unassigned(self):
+        assignment = plan_assignment(
+            {1: [(10, 1.0)], 2: [(10, 2.0)], 3: []},
+            {10: 1, 20: 0},
+        )
+        self.assertEqual(assignment, {1: 10})
+
+    def test_never_exceeds_capacity(self):
+        rng = random.Random(16)
+        for _ in range(300):
+            restaurants = range(rng.randint(1, 4))
+            capacity = {restaurant_id: rng.randint(0, 3) for restaurant_id in restaurants}
+            candidates = {
+                order_id: [
+                    (restaurant_id, round(rng.uniform(0, 10), 2))
+                    for restaurant_id in rng.sample(list(restaurants), rng.randint(0, len(restaurants)))
+                ]
+                for order_id in range(rng.randint(0, 8))
+            }
+
+            assignment = plan_assignment(candidates, capacity)
+
+            load = Counter(assignment.values())
+            for restaurant_id, orders_count in load.items():
+                self.assertLessEqual(orders_count, capacity[restaurant_id], (candidates, capacity, assignment))
+            for order_id, restaurant_id in assignment.items():
+                self.assertIn(restaurant_id, dict(candidates[order_id]), (candidates, capacity, assignment))
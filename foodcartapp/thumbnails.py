@@ -0,0 +1,83 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps
+
+
+RENDITION_WIDTHS = {
+    'list': 100,
+    'card': 400,
+    'quick_view': 800,
+}
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+
+def get_thumbnail_name(image_name, rendition, image_format):
+    # Расширение оригинала остаётся в имени, чтобы копии burger.jpg и burger.png не совпали.
+    stem, extension = os.path.splitext(image_name)
+    if extension:
+        stem = f'{stem}-{extension[1:]}'
+    return f'thumbnails/{stem}-{rendition}.{FORMATS[image_format][1]}'
+
+
+def get_thumbnail_urls(image_name):
+    """{вариант: {формат: url}} для всех вариантов картинки."""
+    return {
+        rendition: {
+            image_format: f'{settings.MEDIA_URL}{filepath_to_uri(get_thumbnail_name(image_name, rendition, image_format))}'
+            for image_format in FORMATS
+        }
+        for rendition in RENDITION_WIDTHS
+    }
+
+
+def resize_to_width(image, width):
+    if image.width <= width:
+        return image.copy()
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def flatten(image):
+    """JPEG не умеет прозрачность, поэтому прозрачный фон заливается белым."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_thumbnails(image_name, storage=default_storage):
+    """Сохраняет уменьшенные копии картинки во всех вариантах и форматах.
+
+    Картинки, которые уже варианта, не увеличиваются. Существующие
+    копии перезаписываются. Возвращает имена сохранённых файлов.
+    """
+    with storage.open(image_name) as image_file:
+        original = Image.open(image_file)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+
+    saved = []
+    for rendition, width in RENDITION_WIDTHS.items():
+        resized = resize_to_width(original, width)
+        for image_format, (pil_format, _, save_options) in FORMATS.items():
+            if pil_format == 'JPEG':
+                image = flatten(resized)
+            else:
+                image = resized.convert('RGBA' if resized.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            content = BytesIO()
+            image.save(content, pil_format, **save_options)
+            name = get_thumbnail_name(image_name, rendition, image_format)
+            if storage.exists(name):
+                storage.delete(name)
+            saved.append(storage.save(name, ContentFile(content.getvalue())))
+    return saved
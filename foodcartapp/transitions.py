@@ -0,0 +1,94 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .candidates import refresh_candidates
+from .models import Order, OrderCandidate, RestaurantLoad
+
+
+STATUS_TIMESTAMPS = {
+    Order.PREPARING: 'called_at',
+    Order.FINISHED: 'delivered_at',
+}
+
+
+def apply_transitions(transitions):
+    """Меняет статусы и рестораны заказов одной транзакцией.
+
+    Каждый переход — словарь с ключами `order`, `status` и необязательными
+    `version`, `expected_status`, `restaurant`. Переход применяется
+    условным UPDATE, только если версия или статус заказа совпадают с
+    ожидаемыми, иначе попадает в конфликты вместе с текущим состоянием
+    заказа. При переходе в «Готовится» и «Завершенный» проставляются
+    время звонка и время доставки, если они ещё не заполнены, а заказы,
+    покинувшие статус «Необработанный», теряют рестораны-кандидаты.
+    Заказам, вернувшимся в «Необработанный», кандидаты подбираются заново.
+    Возвращает (применённые, конфликты).
+    """
+    applied = []
+    conflicts = []
+    now = timezone.now()
+    with transaction.atomic():
+        current_states = {
+            order_id: (restaurant_id, status, version)
+            for order_id, restaurant_id, status, version in (
+                Order.objects
+                .select_for_update()
+                .filter(pk__in=[transition['order'] for transition in transitions])
+                .order_by('pk')
+                .values_list('id', 'assigned_at_id', 'status', 'version')
+            )
+        }
+        load_changes = Counter()
+        for transition in transitions:
+            order_id = transition['order']
+            if order_id not in current_states:
+                conflicts.append({'order': order_id, 'reason': 'not_found'})
+                continue
+            restaurant_id, status, version = current_states[order_id]
+
+            orders = Order.objects.filter(pk=order_id)
+            if 'version' in transition:
+                orders = orders.filter(version=transition['version'])
+            if 'expected_status' in transition:
+                orders = orders.filter(status=transition['expected_status'])
+            new_restaurant_id = transition.get('restaurant', restaurant_id)
+            changes = {
+                'status': transition['status'],
+                'assigned_at_id': new_restaurant_id,
+                'updated_at': now,
+                'version': F('version') + 1,
+            }
+            timestamp_field = STATUS_TIMESTAMPS.get(transition['status'])
+            if timestamp_field:
+                changes[timestamp_field] = Coalesce(F(timestamp_field), now)
+            if not orders.update(**changes):
+                conflicts.append({
+                    'order': order_id,
+                    'reason': 'conflict',
+                    'status': status,
+                    'version': version,
+                    'restaurant': restaurant_id,
+                })
+                continue
+
+            load_changes[(restaurant_id, status)] -= 1
+            load_changes[(new_restaurant_id, transition['status'])] += 1
+            current_states[order_id] = (new_restaurant_id, transition['status'], version + 1)
+            applied.append({
+                'order': order_id,
+                'status': transition['status'],
+                'version': version + 1,
+                'restaurant': new_restaurant_id,
+            })
+        RestaurantLoad.objects.shift(load_changes)
+        OrderCandidate.objects.filter(
+            order__in=[change['order'] for change in applied if change['status'] != Order.UNHANDLED],
+        ).delete()
+    unhandled_ids = [change['order'] for change in applied if change['status'] == Order.UNHANDLED]
+    if unhandled_ids:
+        refresh_candidates(Order.objects.filter(pk__in=unhandled_ids))
+    return applied, conflicts
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.db import transaction
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.renderers import JSONRenderer
@@ -9,60 +11,37 @@ from rest_framework.serializers import ModelSerializer
 from rest_framework.serializers import ListField
 
 
-from .models import Product, Order, OrderElement
-from location.models import Location
+from .candidates import refresh_candidates
+from .catalog import get_product_catalog, parse_catalog_query, serialize_banners
+from .dispatch import dispatch_orders
+from .models import Order, OrderElement
+from .renderers import json_response
+from location.models import GeocodeJob
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return json_response(serialize_banners())
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    try:
+        query = parse_catalog_query(request.GET)
+    except ValueError as error:
+        return json_response({'error': str(error)}, status=400)
+    catalog = get_product_catalog(query)
+    etag = f'"{catalog.version}"'
+    last_modified = catalog.version // 1_000_000
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(catalog.body, content_type='application/json')
+    if catalog.next_cursor is not None:
+        params = request.GET.copy()
+        params['after'] = catalog.next_cursor
+        response['Link'] = f'<{request.path}?{params.urlencode()}>; rel="next"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 class ElementSerializer(ModelSerializer):
@@ -94,8 +73,12 @@ def register_order(request):
         lastname=serializer.validated_data['lastname'],
         phonenumber=serializer.validated_data['phonenumber'],
         address=serializer.validated_data['address'],
+        total_price=sum(
+            product['product'].price * product['quantity']
+            for product in serializer.validated_data['products']
+        ),
     )
-    Location.objects.get_or_create_location(serializer.validated_data['address'])
+    GeocodeJob.objects.enqueue(serializer.validated_data['address'])
     objs = [
         OrderElement(
             product=product['product'],
@@ -106,5 +89,8 @@ def register_order(request):
         for product in serializer.validated_data['products']
     ]
     OrderElement.objects.bulk_create(objs)
+    refresh_candidates(Order.objects.filter(pk=order.pk))
+    if settings.DISPATCH_ON_ORDER_CREATE:
+        transaction.on_commit(dispatch_orders)
     serializer = OrderSerializer(order)
-    return JsonResponse(serializer.data)
+    return json_response(serializer.data)
@@ -0,0 +1,52 @@
+import re
+
+
+STREET_TYPES = {
+    'улица': 'ул',
+    'ул': 'ул',
+    'проспект': 'пр-т',
+    'пр-т': 'пр-т',
+    'пр': 'пр-т',
+    'переулок': 'пер',
+    'пер': 'пер',
+    'бульвар': 'б-р',
+    'б-р': 'б-р',
+    'шоссе': 'ш',
+    'ш': 'ш',
+    'площадь': 'пл',
+    'пл': 'пл',
+    'набережная': 'наб',
+    'наб': 'наб',
+    'проезд': 'пр-д',
+    'пр-д': 'пр-д',
+    'город': 'г',
+    'г': 'г',
+}
+SKIPPED_WORDS = {'д', 'дом'}
+SYNONYMS = {
+    'корпус': 'к',
+    'корп': 'к',
+    'строение': 'стр',
+}
+
+
+def normalize_address(address):
+    """Приводит адрес к ключу, по которому ищутся закэшированные координаты.
+
+    «ул. Ленина 5», «Ленина ул, 5 » и «УЛИЦА ЛЕНИНА, д. 5» дают один ключ:
+    регистр, «ё», пунктуация и лишние пробелы не учитываются, сокращения
+    приводятся к одному виду, а тип улицы не зависит от места в строке.
+    """
+    address = address.lower().replace('ё', 'е')
+    words = re.findall(r'[\w-]+', address)
+    meaningful_words = []
+    street_types = []
+    for word in words:
+        word = word.strip('-')
+        if not word or word in SKIPPED_WORDS:
+            continue
+        if word in STREET_TYPES:
+            street_types.append(STREET_TYPES[word])
+            continue
+        meaningful_words.append(SYNONYMS.get(word, word))
+    return ' '.join(meaningful_words + sorted(street_types))
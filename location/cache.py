@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .address import normalize_address
+
+
+CachedLocation = namedtuple('CachedLocation', ['longitude', 'latitude', 'expires_at'])
+
+
+class LocationCache:
+    """Кэш координат адресов: LRU внутри процесса поверх общего кэша Django.
+
+    Общий уровень хранится в отдельном кэше `cache_alias`, чтобы координаты
+    не вытесняли из кэша по умолчанию каталог и не вытеснялись им. Без
+    `cache_alias` промахи LRU сразу читаются из базы одним запросом.
+
+    Локальная копия живёт не дольше `local_timeout` секунд — так остальные
+    процессы узнают об изменении Location, инвалидированного в другом
+    процессе, без похода в общий кэш на каждое обращение.
+    Адреса, которых ещё нет в базе, не кэшируются.
+    """
+
+    def __init__(self, maxsize, timeout, local_timeout, cache_alias=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.cache_alias = cache_alias
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+        }
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    @staticmethod
+    def make_key(normalized_address):
+        digest = hashlib.md5(normalized_address.encode()).hexdigest()
+        return f'location:{digest}'
+
+    def get(self, address):
+        return self.get_many([address]).get(address)
+
+    def get_many(self, addresses):
+        """Возвращает {адрес: CachedLocation} для всех известных адресов."""
+        from .models import Location
+
+        keys = {address: normalize_address(address) for address in addresses}
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for normalized_address in set(keys.values()):
+                entry = self._local.get(normalized_address)
+                if entry is None:
+                    continue
+                value, local_expires_at = entry
+                if local_expires_at < now:
+                    del self._local[normalized_address]
+                    continue
+                self._local.move_to_end(normalized_address)
+                found[normalized_address] = value
+            self.stats['local_hits'] += len(found)
+
+        missing = set(keys.values()) - set(found)
+        if missing and self.shared is not None:
+            cache_keys = {self.make_key(normalized_address): normalized_address for normalized_address in missing}
+            shared = {
+                cache_keys[cache_key]: value
+                for cache_key, value in self.shared.get_many(list(cache_keys)).items()
+            }
+            with self._lock:
+                self.stats['shared_hits'] += len(shared)
+            self._remember_locally(shared)
+            found.update(shared)
+            missing -= set(shared)
+
+        if missing:
+            locations = (
+                Location.objects
+                .filter(normalized_address__in=missing)
+                .only('normalized_address', 'longitude', 'latitude', 'time_refreshed')
+            )
+            loaded = {
+                location.normalized_address: CachedLocation(
+                    location.longitude,
+                    location.latitude,
+                    location.expires_at,
+                )
+                for location in locations
+            }
+            with self._lock:
+                self.stats['misses'] += len(missing)
+            if self.shared is not None:
+                self.shared.set_many(
+                    {self.make_key(normalized_address): value for normalized_address, value in loaded.items()},
+                    self.timeout,
+                )
+            self._remember_locally(loaded)
+            found.update(loaded)
+
+        return {
+            address: found[normalized_address]
+            for address, normalized_address in keys.items()
+            if normalized_address in found
+        }
+
+    def invalidate(self, normalized_addresses):
+        with self._lock:
+            for normalized_address in normalized_addresses:
+                self._local.pop(normalized_address, None)
+        if self.shared is not None:
+            self.shared.delete_many([self.make_key(normalized_address) for normalized_address in normalized_addresses])
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _remember_locally(self, values):
+        local_expires_at = time.monotonic() + self.local_timeout
+        with self._lock:
+            for normalized_address, value in values.items():
+                self._local[normalized_address] = (value, local_expires_at)
+                self._local.move_to_end(normalized_address)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+
+location_cache = LocationCache(
+    maxsize=settings.LOCATION_CACHE_SIZE,
+    timeout=settings.LOCATION_CACHE_TIMEOUT,
+    local_timeout=settings.LOCATION_CACHE_LOCAL_TIMEOUT,
+    cache_alias='locations' if 'locations' in settings.CACHES else None,
+)
@@ -0,0 +1,37 @@
+import math
+
+import numpy as np
+from geopy import distance
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def to_array(points):
+    """Превращает список (долгота, широта) или None в массив n×2, None становятся NaN."""
+    return np.array(
+        [point if point is not None else (np.nan, np.nan) for point in points],
+        dtype=float,
+    ).reshape(-1, 2)
+
+
+def haversine_matrix(origins, destinations):
+    """Матрица расстояний в км между всеми парами точек двух массивов n×2 и m×2."""
+    origins = np.radians(origins)
+    destinations = np.radians(destinations)
+    lon1 = origins[:, 0][:, np.newaxis]
+    lat1 = origins[:, 1][:, np.newaxis]
+    lon2 = destinations[:, 0][np.newaxis, :]
+    lat2 = destinations[:, 1][np.newaxis, :]
+    haversine = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
+
+
+def geodesic_km(origin, destination):
+    (lon1, lat1), (lon2, lat2) = origin, destination
+    return distance.distance((lat1, lon1), (lat2, lon2)).km
+
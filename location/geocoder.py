@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+@lru_cache(maxsize=None)
+def get_geocoder():
+    backend = import_string(settings.GEOCODER_BACKEND)
+    return backend.from_settings(settings)
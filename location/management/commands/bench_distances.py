@@ -0,0 +1,46 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from location.distances import geodesic_km, haversine_matrix, to_array
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость расчёта расстояний заказ–ресторан через geopy и NumPy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=300)
+        parser.add_argument('--restaurants', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+
+        def random_point():
+            return rnd.uniform(37.35, 37.85), rnd.uniform(55.57, 55.92)
+
+        orders = [random_point() for _ in range(options['orders'])]
+        restaurants = [random_point() for _ in range(options['restaurants'])]
+
+        started_at = time.perf_counter()
+        geopy_km = np.array([
+            [geodesic_km(order, restaurant) for restaurant in restaurants]
+            for order in orders
+        ])
+        geopy_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        numpy_km = haversine_matrix(to_array(orders), to_array(restaurants))
+        numpy_seconds = time.perf_counter() - started_at
+
+        pairs = len(orders) * len(restaurants)
+        self.stdout.write(f'Пар заказ–ресторан: {pairs}')
+        self.stdout.write(f'geopy (геодезическое): {geopy_seconds * 1000:.1f} мс')
+        self.stdout.write(f'NumPy (гаверсинус):    {numpy_seconds * 1000:.1f} мс')
+        self.stdout.write(f'Ускорение: {geopy_seconds / numpy_seconds:.0f}×')
+        self.stdout.write(
+            f'Макс. расхождение: {np.max(np.abs(geopy_km - numpy_km)) * 1000:.0f} м, '
+            f'относительное: {np.max(np.abs(geopy_km - numpy_km) / geopy_km) * 100:.2f}%'
+        )
@@ -0,0 +1,133 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from fetch_coordinates import GeocoderError, RateLimiter
+from foodcartapp.candidates import refresh_candidates
+from foodcartapp.models import Order, Restaurant
+from foodcartapp.restaurant_index import invalidate_restaurant_index
+from location.address import normalize_address
+from location.cache import location_cache
+from location.geocoder import get_geocoder
+from location.models import Location
+
+
+def get_addresses_to_geocode():
+    """Адреса без координат, кроме тех, что геокодер недавно не нашёл.
+
+    Ненайденный адрес хранится в Location без координат и снова
+    запрашивается только после LOCATION_NEGATIVE_TTL, поэтому
+    повторный запуск не платит за него ещё раз.
+    """
+    known = Location.objects.filter(
+        Q(longitude__isnull=False, latitude__isnull=False)
+        | Q(time_refreshed__gte=timezone.now() - settings.LOCATION_NEGATIVE_TTL),
+        normalized_address=OuterRef('normalized_address'),
+    )
+    restaurant_addresses = (
+        Restaurant.objects
+        .exclude(address='')
+        .filter(~Exists(known))
+        .values_list('address', flat=True)
+    )
+    order_addresses = (
+        Order.objects
+        .exclude(address='')
+        .filter(~Exists(known))
+        .values_list('address', flat=True)
+    )
+    return restaurant_addresses.union(order_addresses)
+
+
+class Command(BaseCommand):
+    help = 'Определяет координаты всех адресов ресторанов и заказов, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Количество параллельных запросов к геокодеру',
+        )
+        parser.add_argument(
+            '--rps',
+            type=float,
+            default=10,
+            help='Не больше стольких запросов к геокодеру в секунду',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Сколько результатов записывать в базу за раз',
+        )
+
+    def handle(self, *args, **options):
+        addresses = {
+            normalize_address(address): address
+            for address in get_addresses_to_geocode()
+        }
+        total = len(addresses)
+        self.stdout.write(f'Адресов без координат: {total}')
+        if not total:
+            return
+
+        # Ограничитель ставится на копию геокодера, чтобы он считал каждую
+        # попытку запроса, включая повторы внутри геокодера.
+        geocoder = copy.copy(get_geocoder())
+        geocoder.rate_limiter = RateLimiter(options['rps'])
+
+        processed = errors = 0
+        results = {}
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(geocoder.fetch_coordinates, address): address for address in addresses.values()}
+            for future in as_completed(futures):
+                processed += 1
+                address = futures[future]
+                try:
+                    results[address] = future.result()
+                except GeocoderError as error:
+                    errors += 1
+                    self.stderr.write(f'{address}: {error}')
+                if len(results) >= options['chunk_size']:
+                    self.save_locations(results)
+                    results = {}
+                    self.stdout.write(f'Обработано {processed} из {total}, ошибок: {errors}')
+        self.save_locations(results)
+        invalidate_restaurant_index()
+        refresh_candidates(Order.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обработано {processed} адресов, ошибок: {errors}'
+        ))
+
+    def save_locations(self, results):
+        if not results:
+            return
+        now = timezone.now()
+        normalized_addresses = {address: normalize_address(address) for address in results}
+        existing = Location.objects.in_bulk(
+            list(normalized_addresses.values()),
+            field_name='normalized_address',
+        )
+        to_update = []
+        to_create = []
+        for address, (lon, lat) in results.items():
+            normalized_address = normalized_addresses[address]
+            location = existing.get(normalized_address) or Location(
+                address=address,
+                normalized_address=normalized_address,
+            )
+            location.longitude = lon
+            location.latitude = lat
+            location.time_refreshed = now
+            if location.pk:
+                to_update.append(location)
+            else:
+                to_create.append(location)
+        Location.objects.bulk_update(to_update, ['longitude', 'latitude', 'time_refreshed'])
+        Location.objects.bulk_create(to_create, ignore_conflicts=True)
+        location_cache.invalidate(list(normalized_addresses.values()))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from location.models import GeocodeJob
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь задач геокодирования и обновляет устаревшие координаты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач забирать из очереди за раз',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2,
+            help='Пауза в секундах, если очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь один раз и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            jobs = GeocodeJob.objects.claim(options['batch_size'])
+            for job in jobs:
+                if job.run():
+                    self.stdout.write(f'Геокодирован адрес: {job.address}')
+                else:
+                    self.stderr.write(f'Не удалось геокодировать {job.address}: {job.last_error}')
+            if jobs:
+                continue
+            if GeocodeJob.objects.enqueue_stale(options['batch_size']):
+                continue
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,39 @@
+# Generated by Django 3.2 on 2026-10-18 19:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0002_auto_20220811_2006'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=100, unique=True, verbose_name='Адрес')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить после')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время создания')),
+            ],
+            options={
+                'verbose_name': 'Задача геокодирования',
+                'verbose_name_plural': 'Задачи геокодирования',
+            },
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='time_refreshed',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время последнего обновления'),
+        ),
+        migrations.AddIndex(
+            model_name='geocodejob',
+            index=models.Index(fields=['status', 'run_after'], name='location_ge_status_67e262_idx'),
+        ),
+    ]
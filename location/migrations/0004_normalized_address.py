@@ -0,0 +1,82 @@
+# Generated by Django 3.2 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+from location.address import normalize_address
+
+
+def merge_duplicate_locations(apps, schema_editor):
+    Location = apps.get_model('location', 'Location')
+    kept_locations = {}
+    duplicate_ids = []
+    locations = Location.objects.order_by('-time_refreshed', 'id')
+    for location in locations.iterator(chunk_size=200):
+        location.normalized_address = normalize_address(location.address)
+        kept_location = kept_locations.get(location.normalized_address)
+        if kept_location is None:
+            kept_locations[location.normalized_address] = location
+        elif kept_location.longitude is None and location.longitude is not None:
+            duplicate_ids.append(kept_location.id)
+            kept_locations[location.normalized_address] = location
+        else:
+            duplicate_ids.append(location.id)
+    Location.objects.filter(id__in=duplicate_ids).delete()
+    Location.objects.bulk_update(kept_locations.values(), ['normalized_address'], batch_size=200)
+
+
+def merge_duplicate_jobs(apps, schema_editor):
+    GeocodeJob = apps.get_model('location', 'GeocodeJob')
+    kept_jobs = {}
+    duplicate_ids = []
+    for job in GeocodeJob.objects.order_by('id').iterator(chunk_size=200):
+        job.normalized_address = normalize_address(job.address)
+        if job.normalized_address in kept_jobs:
+            duplicate_ids.append(job.id)
+        else:
+            kept_jobs[job.normalized_address] = job
+    GeocodeJob.objects.filter(id__in=duplicate_ids).delete()
+    GeocodeJob.objects.bulk_update(kept_jobs.values(), ['normalized_address'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0003_geocodejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='geocodejob',
+            name='address',
+            field=models.CharField(max_length=100, verbose_name='Адрес'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='address',
+            field=models.CharField(max_length=100, verbose_name='Адрес'),
+        ),
+        migrations.AddField(
+            model_name='geocodejob',
+            name='normalized_address',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Нормализованный адрес'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='normalized_address',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Нормализованный адрес'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicate_locations, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='geocodejob',
+            name='normalized_address',
+            field=models.CharField(editable=False, max_length=200, unique=True, verbose_name='Нормализованный адрес'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='normalized_address',
+            field=models.CharField(editable=False, max_length=200, unique=True, verbose_name='Нормализованный адрес'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.2 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+def parse_coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def convert_coordinates(apps, schema_editor):
+    Location = apps.get_model('location', 'Location')
+    locations = []
+    for location in Location.objects.all().iterator(chunk_size=200):
+        location.longitude_float = parse_coordinate(location.longitude)
+        location.latitude_float = parse_coordinate(location.latitude)
+        if location.longitude_float is None or location.latitude_float is None:
+            location.longitude_float = location.latitude_float = None
+        locations.append(location)
+    Location.objects.bulk_update(locations, ['longitude_float', 'latitude_float'], batch_size=200)
+
+
+def restore_coordinates(apps, schema_editor):
+    Location = apps.get_model('location', 'Location')
+    locations = []
+    for location in Location.objects.all().iterator(chunk_size=200):
+        if location.longitude_float is not None:
+            location.longitude = str(location.longitude_float)
+            location.latitude = str(location.latitude_float)
+        locations.append(location)
+    Location.objects.bulk_update(locations, ['longitude', 'latitude'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0004_normalized_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='longitude_float',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='latitude_float',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.RunPython(convert_coordinates, restore_coordinates),
+        migrations.RemoveField(
+            model_name='location',
+            name='longitude',
+        ),
+        migrations.RemoveField(
+            model_name='location',
+            name='latitude',
+        ),
+        migrations.RenameField(
+            model_name='location',
+            old_name='longitude_float',
+            new_name='longitude',
+        ),
+        migrations.RenameField(
+            model_name='location',
+            old_name='latitude_float',
+            new_name='latitude',
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['latitude', 'longitude'], name='location_lo_latitud_7045c4_idx'),
+        ),
+    ]
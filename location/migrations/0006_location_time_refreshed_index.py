@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 19:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0005_float_coordinates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='time_refreshed',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Время последнего обновления'),
+        ),
+    ]
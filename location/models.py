@@ -1,53 +1,314 @@
-from django.core.exceptions import ObjectDoesNotExist
+import math
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
 from django.utils import timezone
 
-from fetch_coordinates import fetch_coordinates
+from fetch_coordinates import GeocoderError, GeocoderUnavailable
+from .address import normalize_address
+from .cache import location_cache
+from .distances import EARTH_RADIUS_KM, KM_PER_DEGREE
+from .geocoder import get_geocoder
 
 
-class LocationManager(models.Manager):
-    def get_or_create_location(self, address):
-        try:
-            location = self.get(address=address)
-        except ObjectDoesNotExist:
-            lon, lat = fetch_coordinates(settings.GEOCODER_API_KEY, address)
-            location = self.create(
-                address=address,
-                longitude=lon,
-                latitude=lat,
-            )
-        return location
+def get_bbox(point, radius_km):
+    """Возвращает (мин. долгота, мин. широта, макс. долгота, макс. широта) квадрата вокруг точки."""
+    lon, lat = point
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return lon - lon_delta, lat - lat_delta, lon + lon_delta, lat + lat_delta
+
+
+class LocationQuerySet(models.QuerySet):
+    def geocoded(self):
+        return self.filter(longitude__isnull=False, latitude__isnull=False)
+
+    def stale(self):
+        now = timezone.now()
+        return self.filter(
+            Q(longitude__isnull=False, time_refreshed__lt=now - settings.LOCATION_TTL)
+            | Q(longitude__isnull=True, time_refreshed__lt=now - settings.LOCATION_NEGATIVE_TTL)
+        )
+
+    def within_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        return self.filter(
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon),
+        )
+
+    def near(self, point, radius_km):
+        """Места не дальше radius_km от точки (долгота, широта).
+
+        Сначала отсекает всё за пределами описанного квадрата по индексу
+        (latitude, longitude), затем считает расстояние по формуле гаверсинусов.
+        """
+        lon, lat = point
+        haversine = Power(Sin((Radians(F('latitude')) - math.radians(lat)) / 2), 2) + (
+            Value(math.cos(math.radians(lat)))
+            * Cos(Radians(F('latitude')))
+            * Power(Sin((Radians(F('longitude')) - math.radians(lon)) / 2), 2)
+        )
+        return (
+            self
+            .within_bbox(*get_bbox(point, radius_km))
+            .annotate(distance_km=2 * EARTH_RADIUS_KM * ASin(Sqrt(haversine)))
+            .filter(distance_km__lte=radius_km)
+        )
 
 
 class Location(models.Model):
     address = models.CharField(
         verbose_name='Адрес',
         max_length=100,
-        unique=True
     )
-    longitude = models.CharField(
+    normalized_address = models.CharField(
+        'Нормализованный адрес',
+        max_length=200,
+        unique=True,
+        editable=False,
+    )
+    longitude = models.FloatField(
         'Долгота',
-        max_length=20,
         null=True,
         blank=True,
     )
-    latitude = models.CharField(
+    latitude = models.FloatField(
         'Широта',
-        max_length=20,
         null=True,
         blank=True
     )
     time_refreshed = models.DateTimeField(
         'Время последнего обновления',
-        default=timezone.now
+        default=timezone.now,
+        db_index=True,
     )
 
-    objects = LocationManager()
-    
+    objects = LocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Местоположение'
         verbose_name_plural = 'Местоположения'
+        indexes = [
+            models.Index(fields=['latitude', 'longitude']),
+        ]
 
     def __str__(self) -> str:
         return self.address
+
+    @property
+    def expires_at(self):
+        if self.longitude is None:
+            return self.time_refreshed + settings.LOCATION_NEGATIVE_TTL
+        return self.time_refreshed + settings.LOCATION_TTL
+
+    def is_stale(self):
+        return self.expires_at < timezone.now()
+
+    def clean(self):
+        duplicates = (
+            Location.objects
+            .filter(normalized_address=normalize_address(self.address))
+            .exclude(pk=self.pk)
+        )
+        if duplicates.exists():
+            raise ValidationError({'address': 'Такой адрес уже есть в базе'})
+
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
+
+class GeocodeJobQuerySet(models.QuerySet):
+    def due(self):
+        return (
+            self
+            .filter(
+                status__in=[GeocodeJob.PENDING, GeocodeJob.RUNNING],
+                run_after__lte=timezone.now(),
+            )
+            .order_by('run_after', 'id')
+        )
+
+
+class GeocodeJobManager(models.Manager.from_queryset(GeocodeJobQuerySet)):
+    def enqueue(self, address):
+        """Ставит адрес в очередь, если его координат нет или они устарели.
+
+        Адрес, который геокодер не нашёл, хранится в Location без координат
+        и не ставится повторно, пока не истечёт LOCATION_NEGATIVE_TTL. Так же
+        откладывается адрес, на который геокодер раз за разом отвечал ошибкой.
+        """
+        normalized_address = normalize_address(address)
+        location = location_cache.get(address)
+        if location and location.expires_at >= timezone.now():
+            return None
+        if location:
+            # Общий кэш мог отстать от базы, если адрес уже обновил другой процесс.
+            stored_location = Location.objects.filter(normalized_address=normalized_address).first()
+            if stored_location and not stored_location.is_stale():
+                location_cache.invalidate([normalized_address])
+                return None
+        job, created = self.get_or_create(
+            normalized_address=normalized_address,
+            defaults={'address': address},
+        )
+        if job.status == GeocodeJob.FAILED and job.run_after > timezone.now():
+            return job
+        if not created and job.status in [GeocodeJob.DONE, GeocodeJob.FAILED]:
+            job.status = GeocodeJob.PENDING
+            job.attempts = 0
+            job.run_after = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'run_after'])
+        return job
+
+    def enqueue_stale(self, limit):
+        now = timezone.now()
+        queued_addresses = self.filter(
+            Q(status__in=[GeocodeJob.PENDING, GeocodeJob.RUNNING])
+            | Q(status=GeocodeJob.FAILED, run_after__gt=now)
+        ).values('normalized_address')
+        stale_locations = (
+            Location.objects
+            .stale()
+            .exclude(normalized_address__in=queued_addresses)
+            .order_by('time_refreshed')[:limit]
+        )
+        return [self.enqueue(location.address) for location in stale_locations]
+
+    def claim(self, limit):
+        """Забирает пачку готовых к выполнению задач, помечая их взятыми в работу.
+
+        На PostgreSQL параллельные воркеры не получат одни и те же задачи
+        благодаря SKIP LOCKED, на SQLite блокировка просто игнорируется.
+        Взятая задача арендуется на LEASE: если воркер упал, не завершив её,
+        по истечении аренды она снова попадёт в выборку.
+        """
+        with transaction.atomic():
+            jobs = list(
+                self.due()
+                .select_for_update(skip_locked=True)[:limit]
+            )
+            lease_until = timezone.now() + GeocodeJob.LEASE
+            self.filter(pk__in=[job.pk for job in jobs]).update(
+                status=GeocodeJob.RUNNING,
+                attempts=models.F('attempts') + 1,
+                run_after=lease_until,
+            )
+        for job in jobs:
+            job.status = GeocodeJob.RUNNING
+            job.attempts += 1
+            job.run_after = lease_until
+        return jobs
+
+
+class GeocodeJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = timedelta(seconds=30)
+    LEASE = timedelta(minutes=5)
+
+    address = models.CharField(
+        'Адрес',
+        max_length=100,
+    )
+    normalized_address = models.CharField(
+        'Нормализованный адрес',
+        max_length=200,
+        unique=True,
+        editable=False,
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток',
+        default=0,
+    )
+    run_after = models.DateTimeField(
+        'Выполнить после',
+        default=timezone.now,
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        'Время создания',
+        default=timezone.now,
+    )
+
+    objects = GeocodeJobManager()
+
+    class Meta:
+        verbose_name = 'Задача геокодирования'
+        verbose_name_plural = 'Задачи геокодирования'
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.address} ({self.get_status_display()})'
+
+    def run(self):
+        try:
+            lon, lat = get_geocoder().fetch_coordinates(self.address)
+        except GeocoderError as error:
+            self.fail(error)
+            return False
+        location = Location.objects.filter(normalized_address=self.normalized_address).first()
+        if lon is None and location and location.longitude is not None:
+            # Адрес уже находили раньше: если геокодер вдруг его не нашёл,
+            # оставляем прежние координаты до следующего обновления.
+            location.time_refreshed = timezone.now()
+            location.save(update_fields=['time_refreshed'])
+        else:
+            Location.objects.update_or_create(
+                normalized_address=self.normalized_address,
+                defaults={
+                    'address': self.address,
+                    'longitude': lon,
+                    'latitude': lat,
+                    'time_refreshed': timezone.now(),
+                },
+            )
+        self.status = GeocodeJob.DONE
+        self.last_error = ''
+        self.save(update_fields=['status', 'last_error'])
+        return True
+
+    def fail(self, error):
+        """Откладывает задачу после ошибки геокодера.
+
+        Недоступность геокодера — сеть, 5xx, разомкнутый предохранитель —
+        не говорит ничего об адресе, поэтому попытка не засчитывается,
+        а задача просто ждёт RETRY_DELAY. Location без координат здесь не
+        создаётся никогда: отрицательный кэш только для ненайденных адресов.
+        """
+        self.last_error = repr(error)
+        if isinstance(error, GeocoderUnavailable):
+            self.status = GeocodeJob.PENDING
+            self.attempts = max(self.attempts - 1, 0)
+            self.run_after = timezone.now() + self.RETRY_DELAY
+        elif self.attempts >= self.MAX_ATTEMPTS:
+            self.status = GeocodeJob.FAILED
+            self.run_after = timezone.now() + settings.LOCATION_NEGATIVE_TTL
+        else:
+            self.status = GeocodeJob.PENDING
+            self.run_after = timezone.now() + self.RETRY_DELAY * 2 ** (self.attempts - 1)
+        self.save(update_fields=['status', 'attempts', 'last_error', 'run_after'])
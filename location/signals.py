@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import location_cache
+from .models import Location
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_location_cache(sender, instance, **kwargs):
+    location_cache.invalidate([instance.normalized_address])
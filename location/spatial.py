@@ -0,0 +1,92 @@
+import math
+from collections import defaultdict
+
+from .distances import KM_PER_DEGREE, geodesic_km, haversine_matrix, to_array
+
+
+class GridIndex:
+    """Пространственный индекс точек на равномерной сетке.
+
+    Точки раскладываются по ячейкам примерно `cell_km` × `cell_km`.
+    Поиск ближайших обходит кольца ячеек вокруг запрошенной точки и
+    останавливается, как только найденные точки гарантированно ближе
+    любых ещё не просмотренных. Рассчитан на масштаб города: ширина
+    ячейки по долготе считается по средней широте всех точек.
+    """
+
+    def __init__(self, points, cell_km=2):
+        self.points = {key: point for key, point in points.items() if point is not None}
+        self.cell_km = cell_km
+        latitudes = [lat for _, lat in self.points.values()]
+        reference_lat = sum(latitudes) / len(latitudes) if latitudes else 0
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lon_step = cell_km / (KM_PER_DEGREE * max(math.cos(math.radians(reference_lat)), 0.01))
+        self.cells = defaultdict(list)
+        for key, point in self.points.items():
+            self.cells[self.get_cell(point)].append(key)
+
+    def __len__(self):
+        return len(self.points)
+
+    def get_cell(self, point):
+        lon, lat = point
+        return math.floor(lon / self.lon_step), math.floor(lat / self.lat_step)
+
+    def iter_ring(self, center, ring):
+        x, y = center
+        if ring == 0:
+            yield center
+            return
+        for dx in range(-ring, ring + 1):
+            yield x + dx, y - ring
+            yield x + dx, y + ring
+        for dy in range(-ring + 1, ring):
+            yield x - ring, y + dy
+            yield x + ring, y + dy
+
+    def nearest(self, point, limit=None, radius_km=None, predicate=None, exact_top_n=0):
+        """Возвращает [(ключ, км)] по возрастанию расстояния.
+
+        `predicate(ключ)` отбрасывает неподходящие точки, `limit` и
+        `radius_km` ограничивают количество и дальность результатов.
+        Для первых `exact_top_n` результатов расстояние уточняется
+        по геодезической формуле.
+        """
+        if not self.cells:
+            return []
+        center = self.get_cell(point)
+        max_ring = max(
+            max(abs(x - center[0]), abs(y - center[1]))
+            for x, y in self.cells
+        )
+        found = []
+        for ring in range(max_ring + 1):
+            keys = [
+                key
+                for cell in self.iter_ring(center, ring)
+                for key in self.cells.get(cell, [])
+                if predicate is None or predicate(key)
+            ]
+            if keys:
+                distances = haversine_matrix(
+                    to_array([point]),
+                    to_array([self.points[key] for key in keys]),
+                )[0]
+                found.extend(
+                    (key, float(km))
+                    for key, km in zip(keys, distances)
+                    if radius_km is None or km <= radius_km
+                )
+                found.sort(key=lambda item: item[1])
+            searched_km = ring * self.cell_km
+            if radius_km is not None and searched_km >= radius_km:
+                break
+            if limit is not None and len(found) >= limit and found[limit - 1][1] <= searched_km:
+                break
+        found = found[:limit]
+        if exact_top_n:
+            found[:exact_top_n] = sorted(
+                ((key, geodesic_km(point, self.points[key])) for key, _ in found[:exact_top_n]),
+                key=lambda item: item[1],
+            )
+        return found
@@ -1,3 +1,209 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from fetch_coordinates import CircuitBreaker, GeocoderError, GeocoderUnavailable, YandexGeocoder
+
+from .address import normalize_address
+
+
+def make_geocoder_answer(*points):
+    return {
+        'response': {
+            'GeoObjectCollection': {
+                'featureMember': [
+                    {'GeoObject': {'Point': {'pos': f'{lon} {lat}'}}}
+                    for lon, lat in points
+                ],
+            },
+        },
+    }
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        status, answer, delay = server.answers.pop(0) if server.answers else server.default_answer
+        if delay:
+            time.sleep(delay)
+        body = json.dumps(answer).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGeocoderServer(ThreadingHTTPServer):
+    """HTTP-сервер, отвечающий заранее заданными (статус, JSON, задержка) по очереди."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubGeocoderHandler)
+        self.answers = []
+        self.requests = []
+        self.default_answer = (200, make_geocoder_answer((37.6, 55.7)), 0)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/1.x'
+
+
+class YandexGeocoderTest(SimpleTestCase):
+    def setUp(self):
+        self.server = StubGeocoderServer()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def make_geocoder(self, **kwargs):
+        options = {
+            'base_url': self.server.url,
+            'connect_timeout': 1,
+            'read_timeout': 1,
+            'max_retries': 2,
+            'backoff': 0,
+            'breaker': CircuitBreaker(failure_threshold=100),
+        }
+        options.update(kwargs)
+        return YandexGeocoder('apikey', **options)
+
+    def test_returns_most_relevant_place(self):
+        self.server.answers.append((200, make_geocoder_answer((37.61, 55.75), (30.3, 59.9)), 0))
+        self.assertEqual(self.make_geocoder().fetch_coordinates('Москва, Тверская 1'), (37.61, 55.75))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_returns_none_when_nothing_found(self):
+        self.server.answers.append((200, make_geocoder_answer(), 0))
+        self.assertEqual(self.make_geocoder().fetch_coordinates('нет такого адреса'), (None, None))
+
+    def test_read_timeout_is_retried_then_reported_unavailable(self):
+        self.server.default_answer = (200, make_geocoder_answer((37.6, 55.7)), 0.5)
+        geocoder = self.make_geocoder(read_timeout=0.1, max_retries=1)
+        with self.assertRaises(GeocoderUnavailable):
+            geocoder.fetch_coordinates('Москва, Тверская 1')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_server_errors_are_retried_with_backoff(self):
+        self.server.answers += [(503, {}, 0), (500, {}, 0)]
+        geocoder = self.make_geocoder(max_retries=2, backoff=0.5)
+        with mock.patch('fetch_coordinates.time.sleep') as sleep:
+            self.assertEqual(geocoder.fetch_coordinates('Москва, Тверская 1'), (37.6, 55.7))
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(sleep.call_count, 2)
+        first_delay, second_delay = (call.args[0] for call in sleep.call_args_list)
+        self.assertLessEqual(first_delay, 0.5)
+        self.assertLessEqual(second_delay, 1)
+
+    def test_rate_limiter_counts_every_attempt(self):
+        self.server.answers += [(503, {}, 0), (500, {}, 0)]
+        rate_limiter = mock.Mock()
+        geocoder = self.make_geocoder(max_retries=2, rate_limiter=rate_limiter)
+        self.assertEqual(geocoder.fetch_coordinates('Москва, Тверская 1'), (37.6, 55.7))
+        self.assertEqual(rate_limiter.wait.call_count, 3)
+
+    def test_server_errors_exhaust_retries(self):
+        self.server.default_answer = (502, {}, 0)
+        with self.assertRaises(GeocoderUnavailable):
+            self.make_geocoder(max_retries=2).fetch_coordinates('Москва, Тверская 1')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_error_is_not_retried(self):
+        self.server.default_answer = (403, {'message': 'Invalid api key'}, 0)
+        with self.assertRaises(GeocoderError) as raised:
+            self.make_geocoder().fetch_coordinates('Москва, Тверская 1')
+        self.assertNotIsInstance(raised.exception, GeocoderUnavailable)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_unexpected_answer_is_geocoder_error(self):
+        self.server.answers.append((200, {'response': {}}, 0))
+        with self.assertRaises(GeocoderError):
+            self.make_geocoder().fetch_coordinates('Москва, Тверская 1')
+
+    def test_open_breaker_skips_requests_until_trial_succeeds(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        geocoder = self.make_geocoder(max_retries=0, breaker=breaker)
+        self.server.answers += [(500, {}, 0), (500, {}, 0)]
+        for _ in range(2):
+            with self.assertRaises(GeocoderUnavailable):
+                geocoder.fetch_coordinates('Москва, Тверская 1')
+
+        with self.assertRaises(GeocoderUnavailable):
+            geocoder.fetch_coordinates('Москва, Тверская 1')
+        self.assertEqual(len(self.server.requests), 2)
+
+        time.sleep(0.3)
+        self.assertEqual(geocoder.fetch_coordinates('Москва, Тверская 1'), (37.6, 55.7))
+        self.assertEqual(geocoder.fetch_coordinates('Москва, Тверская 1'), (37.6, 55.7))
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_failed_trial_opens_breaker_again(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+        geocoder = self.make_geocoder(max_retries=0, breaker=breaker)
+        self.server.answers += [(500, {}, 0), (500, {}, 0)]
+        with self.assertRaises(GeocoderUnavailable):
+            geocoder.fetch_coordinates('Москва, Тверская 1')
+
+        time.sleep(0.3)
+        with self.assertRaises(GeocoderUnavailable):
+            geocoder.fetch_coordinates('Москва, Тверская 1')
+        with self.assertRaises(GeocoderUnavailable):
+            geocoder.fetch_coordinates('Москва, Тверская 1')
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_half_open_breaker_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        with mock.patch('fetch_coordinates.time.monotonic', return_value=100):
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        with mock.patch('fetch_coordinates.time.monotonic', return_value=131):
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+            self.assertTrue(breaker.allow())
+            self.assertTrue(breaker.allow())
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def assertSameKey(self, *addresses):
+        self.assertEqual(len({normalize_address(address) for address in addresses}), 1, addresses)
+
+    def assertDifferentKeys(self, *addresses):
+        self.assertEqual(len({normalize_address(address) for address in addresses}), len(addresses), addresses)
+
+    def test_spelling_variants_share_key(self):
+        self.assertSameKey('ул. Ленина 5', 'Ленина ул, 5 ', 'УЛИЦА ЛЕНИНА, д. 5', 'улица  Ленина,  дом 5')
+        self.assertSameKey('Королёва 3', 'королева 3')
+        self.assertSameKey('Ленина 5 корпус 1', 'Ленина 5 корп. 1', 'ленина 5 к 1')
+        self.assertSameKey('Ленина 5 строение 2', 'Ленина 5 стр. 2')
+        self.assertSameKey('пр-т Мира 10', 'проспект Мира 10', 'Мира пр. 10')
+
+    def test_different_buildings_keep_different_keys(self):
+        self.assertDifferentKeys('Ленина 5', 'Ленина 15', 'Ленина 51', 'Ленина 5/1')
+        self.assertDifferentKeys('Ленина 5 корпус 1', 'Ленина 5 строение 1', 'Ленина 5')
+        self.assertDifferentKeys('Ленина 5 кв 12', 'Ленина 5')
+
+    def test_different_streets_keep_different_keys(self):
+        self.assertDifferentKeys('ул Ленина 5', 'пр-т Ленина 5', 'пер Ленина 5', 'Ленина проезд 5', 'пл Ленина 5')
+        self.assertDifferentKeys('1-я Тверская-Ямская 5', 'Тверская-Ямская 1 5', 'Тверская-Ямская 15')
+        self.assertDifferentKeys('Москва, Ленина 5', 'Химки, Ленина 5')
+
+    def test_word_order_matters_except_street_type(self):
+        self.assertSameKey('Ленина ул 5', 'ул Ленина 5')
+        self.assertDifferentKeys('Ленина 5', '5 Ленина')
@@ -14,6 +14,9 @@ urlpatterns = [
 
     # TODO заглушка для нереализованного функционала
     path('orders/', views.view_orders, name="view_orders"),
+    path('orders/changes/', views.view_order_changes, name="view_order_changes"),
+    path('orders/transitions/', views.update_order_statuses, name="update_order_statuses"),
+    path('couriers/', views.view_courier_batches, name="view_courier_batches"),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
@@ -1,20 +1,30 @@
+import json
+import time
 from collections import defaultdict
 
 import requests
 
 from django import forms
 from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
-from geopy import distance
+from django.views.decorators.http import require_POST
+from rest_framework import serializers
 
 
-from foodcartapp.models import Product, Restaurant, Order, RestaurantMenuItem, OrderElement
-from location.models import Location
+from foodcartapp.models import Product, Restaurant, Order, OrderCandidate, RestaurantLoad
+from foodcartapp.routes import build_courier_batches
+from foodcartapp.transitions import apply_transitions
+from location.cache import location_cache
 
 
 class Login(forms.Form):
@@ -102,30 +112,49 @@ def view_restaurants(request):
 
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    orders = Order.objects.exclude(status='Finished').add_full_price().order_by('-id', '-status').with_coordinates()
-    menu_items = RestaurantMenuItem.objects.select_related()
-    product_availability = defaultdict(set)
-    restaurants_coordinates = {}
-    for restaurant in Restaurant.objects.with_coordinates():
-        restaurants_coordinates[restaurant] = {
-            'longitude': restaurant.longitude,
-            'latitude': restaurant.latitude
-        }
-    for item in menu_items:
-        if item.product.id not in product_availability[item.restaurant]:
-            product_availability[item.restaurant].add(item.product.id)
-    order_elements = OrderElement.objects.filter(order__status='Unhandled').select_related()
-    order_elements_dict = defaultdict(set)
-    for order_element in order_elements:
-        order_elements_dict[order_element.order].add(order_element.product.id)
+def view_courier_batches(request):
+    return render(request, template_name='courier_batches.html', context={
+        'batches': build_courier_batches(),
+    })
+
+
+def parse_cursor(cursor):
+    try:
+        status, order_id = cursor.rsplit(':', 1)
+        return status, int(order_id)
+    except ValueError:
+        return None
 
-    data_to_render = {'orders': []}
 
+def filter_orders(orders, status, restaurant_id):
+    if status in dict(Order.STATUS_CHOICES):
+        orders = orders.filter(status=status)
+    if restaurant_id.isdigit():
+        orders = orders.filter(assigned_at_id=restaurant_id)
+    return orders
+
+
+def serialize_orders(orders):
+    coordinates = location_cache.get_many(
+        {order.address for order in orders}
+    )
+    candidates = (
+        OrderCandidate.objects
+        .filter(order_id__in=[order.id for order in orders if order.status == Order.UNHANDLED])
+        .select_related('restaurant')
+        .order_by('order_id', 'rank')
+    )
+    order_candidates = defaultdict(list)
+    for candidate in candidates:
+        order_candidates[candidate.order_id].append(candidate)
+    kitchen_load = RestaurantLoad.objects.kitchen_load()
+
+    serialized_orders = []
     for order in orders:
-        data_to_render['orders'].append(
+        serialized_orders.append(
             {
                 'id': order.id,
+                'version': order.version,
                 'full_price': order.full_price,
                 'client': f"{order.firstname} {order.lastname}",
                 'phonenumber': order.phonenumber,
@@ -139,18 +168,155 @@ def view_orders(request):
         if not order.status == 'Unhandled':
             continue
         available_rests = []
-        for (restaurant, menu) in product_availability.items():
-            if not order_elements_dict[order].issubset(menu):
-                continue
-            if not restaurants_coordinates[restaurant]['longitude'] or not order.longitude:
-                distance_text = 'Ошибка определения координат'
+        ranked_candidates = sorted(
+            order_candidates[order.id],
+            key=lambda candidate: (
+                kitchen_load.get(candidate.restaurant_id, 0) >= candidate.restaurant.capacity,
+                candidate.rank,
+            ),
+        )
+        for candidate in ranked_candidates:
+            if candidate.distance_km is not None:
+                distance_text = f"{round(candidate.distance_km, 2)} км"
+            elif order.address not in coordinates:
+                distance_text = 'Координаты адреса ещё определяются'
             else:
-                distance_text = f"""{round(distance.distance(
-                    tuple(restaurants_coordinates[restaurant].values()),
-                    (order.longitude, order.latitude)
-                ).km, 2)} км"""
-            available_rests.append((restaurant.name, distance_text))
-        data_to_render['orders'][-1]['available_rests'] = available_rests
-    1/0
-
-    return render(request, template_name='order_items.html', context=data_to_render)
+                distance_text = 'Ошибка определения координат'
+            load = kitchen_load.get(candidate.restaurant_id, 0)
+            distance_text += f", готовится {load} из {candidate.restaurant.capacity}"
+            available_rests.append((candidate.restaurant.name, distance_text))
+        serialized_orders[-1]['available_rests'] = available_rests
+    return serialized_orders
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    status = request.GET.get('status', '')
+    restaurant_id = request.GET.get('restaurant', '')
+    cursor = parse_cursor(request.GET.get('after', ''))
+    changes_cursor = timezone.now()
+
+    orders = filter_orders(
+        Order.objects
+        .exclude(status=Order.FINISHED)
+        .select_related('assigned_at')
+        .add_full_price()
+        .order_by('-status', '-id'),
+        status,
+        restaurant_id,
+    )
+    if cursor:
+        orders = orders.after_cursor(*cursor)
+    orders = list(orders[:settings.ORDERS_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(orders) > settings.ORDERS_PAGE_SIZE:
+        orders = orders[:settings.ORDERS_PAGE_SIZE]
+        next_cursor = f'{orders[-1].status}:{orders[-1].id}'
+
+    return render(request, template_name='order_items.html', context={
+        'orders': serialize_orders(orders),
+        'statuses': [choice for choice in Order.STATUS_CHOICES if choice[0] != Order.FINISHED],
+        'restaurants': Restaurant.objects.order_by('name'),
+        'selected_status': status,
+        'selected_restaurant': restaurant_id,
+        'next_cursor': next_cursor,
+        'changes_cursor': changes_cursor.isoformat(),
+        'long_poll_timeout': settings.ORDERS_LONG_POLL_TIMEOUT,
+    })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_changes(request):
+    """Заказы, изменившиеся после курсора `since`, в виде готовых строк таблицы.
+
+    С параметром `wait` ответ задерживается, пока не появится заказ новее
+    курсора, но не дольше ORDERS_LONG_POLL_TIMEOUT секунд. updated_at
+    ставится до коммита, поэтому медленная транзакция может закоммитить
+    заказ со штампом старше уже отданного курсора: чтобы не потерять её,
+    в ответ попадают и заказы за ORDERS_CHANGES_OVERLAP до курсора.
+    Повторы страница отбрасывает по версии заказа. Новый курсор — самый
+    поздний updated_at из ответа, а не текущее время.
+    """
+    since = parse_datetime(request.GET.get('since', ''))
+    if not since:
+        return JsonResponse({'error': 'Укажите курсор since'}, status=400)
+    status = request.GET.get('status', '')
+    restaurant_id = request.GET.get('restaurant', '')
+    try:
+        wait = min(float(request.GET.get('wait', 0)), settings.ORDERS_LONG_POLL_TIMEOUT)
+    except ValueError:
+        wait = 0
+
+    new_orders = Order.objects.filter(updated_at__gt=since)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline and not new_orders.exists():
+        time.sleep(1)
+
+    changed_orders = list(
+        Order.objects
+        .filter(updated_at__gt=since - settings.ORDERS_CHANGES_OVERLAP)
+        .select_related('assigned_at')
+        .add_full_price()
+        .order_by('updated_at', 'id')
+    )
+    cursor = max([since] + [order.updated_at for order in changed_orders])
+    visible_ids = set(
+        filter_orders(Order.objects.exclude(status=Order.FINISHED), status, restaurant_id)
+        .filter(pk__in=[order.id for order in changed_orders])
+        .values_list('id', flat=True)
+    )
+    visible_orders = [order for order in changed_orders if order.id in visible_ids]
+    return_url = request.GET.get('next', '')
+    if not url_has_allowed_host_and_scheme(return_url, allowed_hosts={request.get_host()}):
+        return_url = reverse('restaurateur:view_orders')
+    return JsonResponse({
+        'cursor': cursor.isoformat(),
+        'changed': [
+            {
+                'id': order['id'],
+                'version': order['version'],
+                'html': render_to_string('order_row.html', {'order': order, 'return_url': return_url}, request),
+            }
+            for order in serialize_orders(visible_orders)
+        ],
+        'removed': [order.id for order in changed_orders if order.id not in visible_ids],
+    })
+
+
+class TransitionSerializer(serializers.Serializer):
+    order = serializers.IntegerField()
+    version = serializers.IntegerField(required=False)
+    expected_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    restaurant = serializers.PrimaryKeyRelatedField(
+        queryset=Restaurant.objects.all(),
+        allow_null=True,
+        required=False,
+    )
+
+    def validate(self, data):
+        if 'version' not in data and 'expected_status' not in data:
+            raise serializers.ValidationError('Укажите version или expected_status')
+        if data.get('restaurant'):
+            data['restaurant'] = data['restaurant'].id
+        return data
+
+
+@require_POST
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def update_order_statuses(request):
+    """Переводит несколько заказов в новые статусы за один запрос.
+
+    Ожидает JSON вида {"transitions": [{"order": 1, "version": 3,
+    "status": "Preparing", "restaurant": 2}, ...]} и возвращает
+    применённые переходы и конфликты по каждому заказу.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+    serializer = TransitionSerializer(data=data.get('transitions') if isinstance(data, dict) else None, many=True)
+    if not serializer.is_valid():
+        return JsonResponse({'errors': serializer.errors}, status=400, json_dumps_params={'ensure_ascii': False})
+    applied, conflicts = apply_transitions(serializer.validated_data)
+    return JsonResponse({'applied': applied, 'conflicts': conflicts})
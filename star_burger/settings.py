@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 import dj_database_url
 import rollbar
@@ -12,10 +13,36 @@ env.read_env()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
-GEOCODER_API_KEY = env('YA_GEOCODER_API_KEY')
+GEOCODER_BACKEND = env('GEOCODER_BACKEND', 'fetch_coordinates.YandexGeocoder')
+GEOCODER_API_KEY = env('YA_GEOCODER_API_KEY', None)
+GEOCODER_FIXTURE = env('GEOCODER_FIXTURE', None)
+GEOCODER_LATENCY = env.float('GEOCODER_LATENCY', 0)
+GEOCODER_CONNECT_TIMEOUT = env.float('GEOCODER_CONNECT_TIMEOUT', 3.05)
+GEOCODER_READ_TIMEOUT = env.float('GEOCODER_READ_TIMEOUT', 5)
+GEOCODER_MAX_RETRIES = env.int('GEOCODER_MAX_RETRIES', 2)
+LOCATION_TTL = timedelta(days=env.int('LOCATION_TTL_DAYS', 30))
+LOCATION_NEGATIVE_TTL = timedelta(hours=env.int('LOCATION_NEGATIVE_TTL_HOURS', 6))
+LOCATION_CACHE_SIZE = env.int('LOCATION_CACHE_SIZE', 10000)
+LOCATION_CACHE_TIMEOUT = env.int('LOCATION_CACHE_TIMEOUT', 60 * 60)
+LOCATION_CACHE_LOCAL_TIMEOUT = env.int('LOCATION_CACHE_LOCAL_TIMEOUT', 60)
+DISTANCE_EXACT_TOP_N = env.int('DISTANCE_EXACT_TOP_N', 0)
+RESTAURANT_INDEX_CELL_KM = env.float('RESTAURANT_INDEX_CELL_KM', 2)
+RESTAURANTS_SEARCH_LIMIT = env.int('RESTAURANTS_SEARCH_LIMIT', 5)
+RESTAURANTS_SEARCH_RADIUS_KM = env.float('RESTAURANTS_SEARCH_RADIUS_KM', 50)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+ORDERS_LONG_POLL_TIMEOUT = env.int('ORDERS_LONG_POLL_TIMEOUT', 25)
+ORDERS_CHANGES_OVERLAP = timedelta(seconds=env.int('ORDERS_CHANGES_OVERLAP_SECONDS', 5))
+DISPATCH_ON_ORDER_CREATE = env.bool('DISPATCH_ON_ORDER_CREATE', False)
+COURIER_BATCH_SIZE = env.int('COURIER_BATCH_SIZE', 4)
+COURIER_BATCH_RADIUS_KM = env.float('COURIER_BATCH_RADIUS_KM', 3)
+COURIER_BATCH_WINDOW = timedelta(minutes=env.int('COURIER_BATCH_WINDOW_MINUTES', 20))
 
 SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', True)
+CATALOG_SNAPSHOTS_ON_CHANGE = env.bool('CATALOG_SNAPSHOTS_ON_CHANGE', not DEBUG)
+API_COMPACT_JSON = env.bool('API_COMPACT_JSON', not DEBUG)
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+PRODUCTS_PAGE_MAX_SIZE = env.int('PRODUCTS_PAGE_MAX_SIZE', 100)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'])
 
@@ -98,6 +125,28 @@ DATABASES = {
     'default': dj_database_url.parse(env('DB_URL'))
 }
 
+DATABASE_CACHE_BACKEND = 'django.core.cache.backends.db.DatabaseCache'
+CACHE_BACKEND = env('CACHE_BACKEND', DATABASE_CACHE_BACKEND)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': env('CACHE_LOCATION', 'django_cache'),
+    },
+}
+if CACHE_BACKEND == DATABASE_CACHE_BACKEND:
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', 10000),
+    }
+else:
+    # Кэш координат в базе данных не дешевле самой таблицы location_location,
+    # поэтому общий уровень кэша координат включается только с настоящим кэш-сервером.
+    CACHES['locations'] = {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHES['default']['LOCATION'],
+        'KEY_PREFIX': 'locations',
+        'TIMEOUT': LOCATION_CACHE_TIMEOUT,
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',